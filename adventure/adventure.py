@@ -2,6 +2,7 @@
 import asyncio
 import contextlib
 import io
+import itertools
 import json
 import logging
 import os
@@ -12,7 +13,7 @@ from collections import OrderedDict, namedtuple
 from datetime import date, datetime
 from operator import itemgetter
 from types import SimpleNamespace
-from typing import MutableMapping, Optional
+from typing import List, MutableMapping, Optional, Set, Tuple
 
 import discord
 from discord.ext.commands.errors import BadArgument
@@ -29,16 +30,20 @@ from redbot.core.utils.predicates import MessagePredicate, ReactionPredicate
 from tabulate import tabulate
 
 from . import bank
+from .cart import CartStock
 from .charsheet import (
     ORDER,
     RARITIES,
     ArgumentConverter,
+    BackpackQuery,
     Character,
     DayConverter,
     EquipableItemConverter,
     EquipmentConverter,
+    GameSession,
     Item,
     ItemConverter,
+    Loadout,
     PercentageConverter,
     RarityConverter,
     SkillConverter,
@@ -53,6 +58,8 @@ from .charsheet import (
     parse_timedelta,
 )
 from .menus import (
+    BackpackMenu,
+    BackpackSource,
     BaseMenu,
     LeaderboardMenu,
     LeaderboardSource,
@@ -60,14 +67,18 @@ from .menus import (
     ScoreboardSource,
     WeeklyScoreboardSource,
 )
+from .journal import SessionJournal
+from .metrics import Metrics
 from .misc import MiscMixin
 from .role import RoleMixin
+from .scheduler import CountdownScheduler
 from .utils import (
     AdventureResults,
     DynamicInt,
     Emojis,
     FilterInt,
     FilterStr,
+    LockRegistry,
     Member,
     UserCtx,
     check_global_setting_admin,
@@ -78,6 +89,7 @@ from .utils import (
     AdventureOnCooldown,
     start_adding_reactions,
     MENU_CONTROLS,
+    TTLCache,
     is_dm,
 )
 
@@ -164,16 +176,29 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
         self._yes_no_controls = {self.emojis.yes: "yes", self.emojis.no: "no"}
 
         self._adventure_countdown = {}
+        self._user_sessions: MutableMapping[int, Set[int]] = {}
         self._rewards = {}
         self._trader_countdown = {}
         self._current_traders = {}
         self._curent_trader_stock = {}
         self._react_messaged = []
         self.tasks = {}
-        self.locks: MutableMapping[int, asyncio.Lock] = {}
+        self._countdowns = CountdownScheduler()
+        self._cart_stock = CartStock(self._trader_roll)
+        self.locks = LockRegistry()
+        self._perm_cache = TTLCache(ttl=60)
         self.gb_task = None
 
-        self.config = Config.get_conf(self, 2_710_801_001, force_registration=True)
+        self._journal = SessionJournal(cog_data_path(self) / "sessions.jsonl")
+        self._sessions = {}
+        self._restoring: MutableMapping[int, asyncio.Event] = {}
+        self._session_expiry: List[Tuple[float, int, int, GameSession]] = []
+        self._expiry_counter = itertools.count()
+
+        self._metrics = Metrics()
+        self._metrics.install(getattr(bot, "http", None))
+        bank._config = self._metrics.track_config(Metrics.untrack_config(bank._config))
+        self.config = self._metrics.track_config(Config.get_conf(self, 2_710_801_001, force_registration=True))
         self._daily_bonus = {}
         self._separate_economy = None
 
@@ -293,12 +318,12 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
         self.MONSTER_NOW: dict = None
         self.LOCATIONS: list = None
         self.PETS: dict = None
+        self._item_tables = None
 
         self.config.register_guild(**default_guild)
         self.config.register_channel(**default_channel)
         self.config.register_global(**default_global)
         self.config.register_user(**default_user)
-        self.cleanup_loop = self.bot.loop.create_task(self.cleanup_tasks())
         log.debug("Creating Task")
         self._init_task = self.bot.loop.create_task(self.initialize())
         self._timed_roles_task = self.timed_roles_task.start()
@@ -332,8 +357,8 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
             raise AdventureCheckFailure(_("Invalid slot; choose one of {list}.").format(list=humanize_list(ORDER)))
         async with self.get_lock(user):
             c = await self.get_character_from_json(user)
-            for i in range(num):
-                await c.add_to_backpack(await self._genitem(rarity, slot))
+            for item in await self._genitems(rarity, num, slot):
+                await c.add_to_backpack(item, number=item.owned)
             await self.config.user(ctx.author).set(await c.to_json(self.config))
         await ctx.invoke(self._backpack)
 
@@ -351,6 +376,90 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
         await self.config.user(ctx.author).set(user_data)
         await ctx.tick()
 
+    @commands.group(name="advmetrics", invoke_without_command=True)
+    @commands.is_owner()
+    async def advmetrics(self, ctx: Context):
+        """[Owner] Show adventure latency and I/O metrics."""
+        data = self._metrics.to_json()
+        totals = data["totals"]
+        headers = ("Phase", "Calls", "Mean ms", "p50 ms", "p95 ms", "p99 ms", "Max ms")
+        table = [
+            (name, h["count"], h["mean"], h["p50"], h["p95"], h["p99"], h["max"])
+            for (name, h) in data["phases_ms"].items()
+        ]
+        per_adventure = data["per_adventure"]
+        msg = _(
+            "{adventures} adventures in {uptime}.\n"
+            "Config reads: {reads} ({reads_per} per adventure on average)\n"
+            "Config writes: {writes} ({writes_per} per adventure on average)\n"
+            "API calls made by adventures and commands: {api} ({api_per} per adventure on average)\n\n"
+        ).format(
+            adventures=humanize_number(data["adventures"]),
+            uptime=humanize_timedelta(seconds=data["uptime_seconds"]) or _("less than a second"),
+            reads=humanize_number(totals["config_reads"]),
+            reads_per=per_adventure["config_reads"]["mean"],
+            writes=humanize_number(totals["config_writes"]),
+            writes_per=per_adventure["config_writes"]["mean"],
+            api=humanize_number(totals["api_calls"]),
+            api_per=per_adventure["api_calls"]["mean"],
+        )
+        msg += tabulate(table, headers=headers) if table else _("No adventure phases recorded yet.")
+        for page in pagify(msg, delims=["\n"], shorten_by=10):
+            await ctx.send(box(page, lang="css"))
+
+    @advmetrics.command(name="commands")
+    async def advmetrics_commands(self, ctx: Context, sort_by: str = "io"):
+        """[Owner] Show the commands causing the most Config traffic and API calls.
+
+        **sort_by** is one of `io`, `bytes`, `reads`, `writes`, `api_calls` or `invocations`.
+        """
+        sort_by = sort_by.lower()
+        if sort_by not in ("io", "bytes", "reads", "writes", "api_calls", "invocations"):
+            raise AdventureCheckFailure(_("You can only sort by io, bytes, reads, writes, api_calls or invocations."))
+        headers = ("Command", "Calls", "Reads", "Writes", "Reads/call", "Writes/call", "Bytes/call", "API/call")
+        table = []
+        for (name, stats) in self._metrics.heaviest_commands(15, key=sort_by):
+            data = stats.to_json()
+            table.append(
+                (
+                    name,
+                    data["invocations"],
+                    data["reads"],
+                    data["writes"],
+                    data["reads_per_call"],
+                    data["writes_per_call"],
+                    humanize_number(data["bytes_per_call"]) if self._metrics.measure_bytes else "-",
+                    data["api_calls_per_call"],
+                )
+            )
+        if not table:
+            raise AdventureCheckFailure(_("No commands have been recorded yet."))
+        for page in pagify(tabulate(table, headers=headers), delims=["\n"], shorten_by=10):
+            await ctx.send(box(page, lang="css"))
+
+    @advmetrics.command(name="bytes")
+    async def advmetrics_bytes(self, ctx: Context, toggle: bool):
+        """[Owner] Measure the size of Config reads and writes.
+
+        This serialises every value read or written, so leave it off unless you need it.
+        """
+        self._metrics.measure_bytes = toggle
+        await ctx.tick()
+
+    @advmetrics.command(name="dump")
+    async def advmetrics_dump(self, ctx: Context):
+        """[Owner] Send all adventure metrics as a JSON file."""
+        data = self._metrics.to_json()
+        data["locks"] = self.locks.stats()
+        with io.StringIO(json.dumps(data, indent=4)) as stream:
+            await ctx.send(file=discord.File(stream, filename="adventure-metrics.json"))
+
+    @advmetrics.command(name="reset")
+    async def advmetrics_reset(self, ctx: Context):
+        """[Owner] Reset adventure metrics."""
+        self._metrics.reset()
+        await ctx.tick()
+
     @commands.command(name="ebackpack", usage="--diff --level --degrade --rarity --order --slot --name")
     @commands.bot_has_permissions(add_reactions=True)
     async def commands_equipable_backpack(
@@ -413,14 +522,27 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
                         _("{} is not a valid slot, select one of {}").format(slot, humanize_list(ORDER))
                     )
 
-            backpack_contents = _("{author}'s backpack \n\n{backpack}\n").format(
-                author=self.escape(ctx.author.display_name),
-                backpack=await c.get_backpack(name=name, level=level, degrade=degrade, rarity=rarity, slot=slot, show_delta=show_diff, equippable=True, sort_order=sort_order),
+            query = BackpackQuery(
+                name=name,
+                level=level,
+                degrade=degrade,
+                rarity=rarity,
+                slot=slot,
+                equippable=True,
+                sort_order=sort_order,
             )
-            msgs = []
-            async for page in AsyncIter(pagify(backpack_contents, delims=["\n"], shorten_by=20, page_length=1900)):
-                msgs.append(box(page, lang="css"))
-            return await menu(ctx, msgs, MENU_CONTROLS)
+            source = BackpackSource(
+                c,
+                query.run(c),
+                title=_("{author}'s backpack").format(author=self.escape(ctx.author.display_name)),
+                show_delta=bool(show_diff),
+            )
+            return await BackpackMenu(
+                source=source,
+                delete_message_after=False,
+                clear_reactions_after=True,
+                timeout=60,
+            ).start(ctx=ctx)
 
     @commands.command(name="ubackpack", usage="--diff --level --degrade --rarity --order --slot --name")
     @commands.bot_has_permissions(add_reactions=True)
@@ -481,14 +603,27 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
                         _("{} is not a valid slot, select one of {}").format(slot, humanize_list(ORDER)),
                     )
 
-            backpack_contents = _("{author}'s backpack \n\n{backpack}\n").format(
-                author=self.escape(ctx.author.display_name),
-                backpack=await c.get_backpack(name=name, level=level, degrade=degrade, rarity=rarity, slot=slot, show_delta=show_diff, unequippable=True, sort_order=sort_order),
+            query = BackpackQuery(
+                name=name,
+                level=level,
+                degrade=degrade,
+                rarity=rarity,
+                slot=slot,
+                unequippable=True,
+                sort_order=sort_order,
+            )
+            source = BackpackSource(
+                c,
+                query.run(c),
+                title=_("{author}'s backpack").format(author=self.escape(ctx.author.display_name)),
+                show_delta=bool(show_diff),
             )
-            msgs = []
-            async for page in AsyncIter(pagify(backpack_contents, delims=["\n"], shorten_by=20, page_length=1900)):
-                msgs.append(box(page, lang="css"))
-            return await menu(ctx, msgs, MENU_CONTROLS)
+            return await BackpackMenu(
+                source=source,
+                delete_message_after=False,
+                clear_reactions_after=True,
+                timeout=60,
+            ).start(ctx=ctx)
 
     @commands.group(name="backpack", autohelp=False, usage="--diff --level --degrade --rarity --order --slot --name", invoke_without_command=True)
     @commands.bot_has_permissions(add_reactions=True)
@@ -556,32 +691,27 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
                         _("{} is not a valid slot, select one of {}").format(slot, humanize_list(ORDER)),
                     )
 
-            backpack_contents = _("{author}'s backpack \n\n{backpack}\n").format(
-                author=self.escape(ctx.author.display_name),
-                backpack=await c.get_backpack(name=name, level=level, degrade=degrade, rarity=rarity, slot=slot, show_delta=show_diff, sort_order=sort_order),
+            query = BackpackQuery(
+                name=name,
+                level=level,
+                degrade=degrade,
+                rarity=rarity,
+                slot=slot,
+                sort_order=sort_order,
             )
-            msgs = []
-            async for page in AsyncIter(pagify(backpack_contents, delims=["\n"], shorten_by=20, page_length=1900)):
-                msgs.append(box(page, lang="css"))
-            controls = MENU_CONTROLS.copy()
-
-            async def _backpack_info(
-                ctx: commands.Context,
-                pages: list,
-                controls: MutableMapping,
-                message: discord.Message,
-                page: int,
-                timeout: float,
-                emoji: str,
-            ):
-                if message:
-                    await ctx.send_help(self._backpack)
-                    with contextlib.suppress(discord.HTTPException):
-                        await message.delete()
-                    return None
-
-            controls["\N{INFORMATION SOURCE}\N{VARIATION SELECTOR-16}"] = _backpack_info
-            return await menu(ctx, msgs, controls)
+            source = BackpackSource(
+                c,
+                query.run(c),
+                title=_("{author}'s backpack").format(author=self.escape(ctx.author.display_name)),
+                show_delta=bool(show_diff),
+            )
+            return await BackpackMenu(
+                source=source,
+                delete_message_after=False,
+                clear_reactions_after=True,
+                timeout=60,
+                show_help=True,
+            ).start(ctx=ctx)
 
     @_backpack.command(name="equip")
     @is_dm()
@@ -780,35 +910,22 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
             fmt = ""
             c = await self.get_character_from_json(ctx.author)
             total_price = 0
+            modifiers = self._sell_modifiers(c)
+            query = BackpackQuery(
+                name=name,
+                level=level,
+                degrade=degrade,
+                rarity=rarity or None,
+                slot=slot or None,
+                exclude_rarities=("forged", "set"),
+            )
             async with ctx.typing():
-                items = [i for n, i in c.backpack.items() if i.rarity not in ["forged", "set"]]
-                async for item in AsyncIter(items):
-                    e_level = equip_level(c, item)
-
-                    if name and not all(x.is_valid(item.name) for x in name):
-                        continue
-
-                    if level and not all(x.is_valid(e_level) for x in level):
-                        continue
-
-                    if degrade and not all(x.is_valid(item.degrade) for x in degrade):
-                        continue
-
-                    if rarity and item.rarity != rarity:
-                        continue
-                    if slot:
-                        if len(item.slot) == 1 and slot != item.slot[0]:
-                            continue
-                        elif len(item.slot) == 2 and slot != "two handed":
-                            continue
-                    item_price = 0
+                for item in query.select(c):
                     old_owned = item.owned
-                    async for x in AsyncIter(range(0, item.owned)):
-                        item.owned -= 1
-                        item_price += self._sell(c, item)
-                        if item.owned <= 0:
-                            del c.backpack[item.name]
-                    item_price = max(item_price, 0)
+                    item_price = max(self._sell(c, item, amount=old_owned, modifiers=modifiers), 0)
+                    if old_owned > 0:
+                        item.owned = 0
+                        del c.backpack[item.name]
                     fmt += _("{old_item} sells for {price}.\n").format(
                         old_item=str(old_owned) + " " + str(item), price=humanize_number(item_price),
                     )
@@ -1327,7 +1444,7 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
             for (l_name, loadout) in c.loadouts.items():
                 if name and name.lower() == l_name:
                     index = count
-                stats = await self._build_loadout_display({"items": loadout})
+                stats = c.get_loadout(l_name).render()
                 msg = _("[{name} Loadout for {author}]\n\n{stats}").format(
                     name=l_name, author=self.escape(ctx.author.display_name), stats=stats
                 )
@@ -1474,8 +1591,7 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
     @adventureset_locks.command(name="adventure")
     async def adventureset_locks_adventure(self, ctx: Context):
         """[Admin] Reset the adventure game lock for the server."""
-        while ctx.channel.id in self._sessions:
-            del self._sessions[ctx.channel.id]
+        self._end_session(ctx.channel.id)
         await ctx.tick()
 
     @adventureset.command()
@@ -2217,13 +2333,13 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
                     ignored_rarities.append("ascended")
                     ascended_forge_msg += _("\n\nAscended items will be forgeable after 30 rebirths.")
                 consumed = []
-                forgeables_items = [str(i) for n, i in c.backpack.items() if i.rarity not in ignored_rarities]
+                forgeables_items = [str(i) for i in BackpackQuery(exclude_rarities=ignored_rarities).select(c)]
                 if len(forgeables_items) <= 1:
                     raise AdventureCheckFailure(_("**{}**, you need at least two forgeable items in your backpack to forge.").format(
                         self.escape(ctx.author.display_name))
                     )
                 forgeables = _("{author}'s forgeables\n\n{bc}\n").format(
-                    author=self.escape(ctx.author.display_name), bc=await c.get_backpack(forging=True, clean=True)
+                    author=self.escape(ctx.author.display_name), bc=await c.get_backpack(query=BackpackQuery(forging=True))
                 )
                 pages = pagify(forgeables, delims=["\n"], shorten_by=20, page_length=1900)
                 pages = [box(page, lang="css") for page in pages]
@@ -3688,7 +3804,7 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
 
         backpack_contents = _("{author}'s backpack \n\n{backpack}\n").format(
             author=self.escape(ctx.author.display_name),
-            backpack=await c.get_backpack(set_name=title_cased_set_name, clean=True),
+            backpack=await c.get_backpack(set_name=title_cased_set_name),
         )
         async for page in AsyncIter(pagify(backpack_contents, delims=["\n"], shorten_by=20, page_length=1950)):
             msg_list.append(box(page, lang="css"))
@@ -3748,48 +3864,7 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
             )
 
     async def _build_loadout_display(self, userdata, loadout=True):
-        form_string = _("( RAGE  |  RANT  |  ACC  |  DEX  |  LUCK)")
-        form_string += _("\n\nItems Equipped:") if loadout else ""
-        last_slot = ""
-        att = 0
-        cha = 0
-        intel = 0
-        dex = 0
-        luck = 0
-        for (slot, data) in userdata["items"].items():
-
-            if slot == "backpack":
-                continue
-            if last_slot == "two handed":
-                last_slot = slot
-                continue
-
-            if not data:
-                last_slot = slot
-                form_string += _("\n\n {} slot").format(slot.title())
-                continue
-            item = Item.from_json(data)
-            slot_name = userdata["items"][slot]["".join(i for i in data.keys())]["slot"]
-            slot_name = slot_name[0] if len(slot_name) < 2 else _("two handed")
-            form_string += _("\n\n {} slot").format(slot_name.title())
-            last_slot = slot_name
-            rjust = max([len(i) for i in data.keys()])
-            form_string += f"\n  - {str(item):<{rjust}} - "
-            form_string += (
-                f"({item.att if len(item.slot) < 2 else (item.att * 2)} | "
-                f"{item.cha if len(item.slot) < 2 else (item.cha * 2)} | "
-                f"{item.int if len(item.slot) < 2 else (item.int * 2)} | "
-                f"{item.dex if len(item.slot) < 2 else (item.dex * 2)} | "
-                f"{item.luck if len(item.slot) < 2 else (item.luck * 2)})"
-            )
-            att += item.att if len(item.slot) < 2 else (item.att * 2)
-            cha += item.cha if len(item.slot) < 2 else (item.cha * 2)
-            intel += item.int if len(item.slot) < 2 else (item.int * 2)
-            dex += item.dex if len(item.slot) < 2 else (item.dex * 2)
-            luck += item.luck if len(item.slot) < 2 else (item.luck * 2)
-        form_string += _("\n\nTotal stats: ")
-        form_string += f"({att} | {cha} | {intel} | {dex} | {luck})"
-        return form_string + "\n"
+        return Loadout(userdata["items"]).render(loadout)
 
     @commands.command()
     async def unequip(self, ctx: Context, *, item: EquipmentConverter):
@@ -3936,65 +4011,26 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
             challenge = None
 
         adventure_msg = _("You feel adventurous, **{}**?").format(self.escape(ctx.author.display_name))
-        try:
-            reward, participants = await self._simple(ctx, adventure_msg, challenge)
-            await self.config.channel(ctx.channel).cooldown.set(time.time())
-        except Exception as exc:
-            await self.config.channel(ctx.channel).cooldown.set(0)
-            log.exception("Something went wrong controlling the game", exc_info=exc)
-            while ctx.channel.id in self._sessions:
-                del self._sessions[ctx.channel.id]
-            return
-        if not reward and not participants:
-            await self.config.channel(ctx.channel).cooldown.set(0)
-            while ctx.channel.id in self._sessions:
-                del self._sessions[ctx.channel.id]
-            return
-
-        if participants:
-            for user in participants:  # reset activated abilities
-                async with self.get_lock(user):
-                    c = await self.get_character_from_json(user)
-                    if c.heroclass["name"] != "Ranger" and c.heroclass["ability"]:
-
-                        cooldown_time = 0
-                        session = self._sessions[ctx.channel.id]
-                        if c.heroclass["name"] == "Berserker" and user in session.rage:
-                            cooldown_time = max(240, (1140 - ((c.luck + c.total_att) * 2)))
-                        elif c.heroclass["name"] == "Tilter" and user in session.rant:
-                            cooldown_time = max(240, (1140 - ((c.luck + c.total_cha) * 2)))
-                        elif c.heroclass["name"] == "Autoaimer" and user in session.autoaim:
-                            cooldown_time = max(240, (1140 - ((c.luck + c.total_int) * 2)))
-                        elif c.heroclass["name"] == "Samaritan" and user in session.pray:
-                            cooldown_time = int(1.5 * max(240, (1140 - ((c.luck + c.total_int) * 2))))
-
-                        if cooldown_time:
-                            c.heroclass["ability"] = False
+        with self._metrics.adventure():
+            try:
+                reward, participants = await self._simple(ctx, adventure_msg, challenge)
+                await self.config.channel(ctx.channel).cooldown.set(time.time())
+            except Exception as exc:
+                await self.config.channel(ctx.channel).cooldown.set(0)
+                log.exception("Something went wrong controlling the game", exc_info=exc)
+                self._end_session(ctx.channel.id)
+                return
+            if not reward and not participants:
+                await self.config.channel(ctx.channel).cooldown.set(0)
+                self._end_session(ctx.channel.id)
+                return
 
-                        c.heroclass["cooldown"] = time.time() + cooldown_time
-                    if c.last_currency_check + 600 < time.time() or c.bal > c.last_known_currency:
-                        c.last_known_currency = await bank.get_balance(user)
-                        c.last_currency_check = time.time()
-                    await self.config.user(user).set(await c.to_json(self.config))
-
-        reward_copy = reward.copy()
-        send_message = ""
-        for (userid, rewards) in reward_copy.items():
-            if rewards:
-                user = ctx.guild.get_member(userid)  # bot.get_user breaks sometimes :ablobsweats:
-                if user is None:
-                    # sorry no rewards if you leave the server
-                    continue
-                msg = await self._add_rewards(ctx, user, rewards["xp"], rewards["cp"], rewards["special"])
-                if msg:
-                    send_message += f"{msg}\n"
-                self._rewards[userid] = {}
-        if send_message:
-            for page in pagify(send_message):
-                await smart_embed(ctx, page, success=True)
+            send_message = await self._commit_rewards(ctx, participants, reward.copy())
+            if send_message:
+                for page in pagify(send_message):
+                    await smart_embed(ctx, page, success=True)
 
-        while ctx.channel.id in self._sessions:
-            del self._sessions[ctx.channel.id]
+            self._end_session(ctx.channel.id)
 
     @_adventure.error
     async def _error_handler(self, ctx: commands.Context, error: Exception) -> None:
@@ -4003,8 +4039,7 @@ class Adventure(MiscMixin, RoleMixin, commands.Cog):
             error,
             (commands.CheckFailure, commands.UserInputError, commands.DisabledCommand, commands.CommandOnCooldown),
         ):
-            while ctx.channel.id in self._sessions:
-                del self._sessions[ctx.channel.id]
+            self._end_session(ctx.channel.id)
 
     @commands.command()
     @commands.bot_has_permissions(add_reactions=True, embed_links=True)
@@ -12,6 +12,8 @@ from redbot.core.i18n import Translator
 from redbot.core.utils import AsyncIter
 from redbot.core.utils.chat_formatting import humanize_number
 
+from .ranking import rank
+
 if TYPE_CHECKING:
     from redbot.core.bot import Red
 
@@ -425,11 +427,9 @@ async def get_leaderboard(positions: int = None, guild: discord.Guild = None, _f
         for acc in tmp:
             if not guild.get_member(acc):
                 del raw_accounts[acc]
-    sorted_acc = sorted(raw_accounts.items(), key=lambda x: x[1]["balance"], reverse=True)
-    if positions is None:
-        return sorted_acc
-    else:
-        return sorted_acc[:positions]
+    rows = [((v["balance"],), k) for (k, v) in raw_accounts.items()]
+    ranked = rank(rows, positions)
+    return [(k, raw_accounts[k]) for k in ranked]
 
 
 async def get_leaderboard_position(
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+log = logging.getLogger("red.cogs.adventure.cart")
+
+# a cart shows 3 to 9 items, so this covers several carts before a refill is needed
+POOL_SIZE = 45
+LOW_WATER = 18
+# items rolled per step of a refill, so a refill never holds the event loop for long
+BATCH = 9
+
+
+class CartStock:
+    """Pregenerated wares for the traveling cart, one pool per theme.
+
+    Each entry is a stock dict as the cart uses it (``item``, ``price`` and
+    so on) plus its prerendered ``line``. Rolling and pricing items happens
+    in a background task that tops the pool up after carts draw from it, so
+    a cart appearing only has to pop a few entries.
+    """
+
+    def __init__(self, roll: Callable[[int], Awaitable[List[dict]]], size: int = POOL_SIZE, low: int = LOW_WATER):
+        self.size = size
+        self.low = low
+        self._roll = roll
+        self._pools: Dict[str, Deque[dict]] = {}
+        self._theme: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def use_theme(self, theme: str):
+        """Draw from ``theme``'s pool from now on, filling it if needed."""
+        self._theme = theme
+        self._pools.setdefault(theme, deque())
+        self.refill()
+
+    def take(self, howmany: int) -> List[dict]:
+        """Pop up to ``howmany`` entries with distinct item names.
+
+        Returns fewer when the pool runs short; the caller rolls the rest.
+        """
+        pool = self._pools.get(self._theme)
+        if pool is None:
+            return []
+        taken = {}
+        skipped = []
+        while pool and len(taken) < howmany:
+            entry = pool.popleft()
+            if entry["itemname"] in taken:
+                skipped.append(entry)
+            else:
+                taken[entry["itemname"]] = entry
+        # name clashes go back for a later cart
+        pool.extend(skipped)
+        self.refill()
+        return list(taken.values())
+
+    def refill(self):
+        if self._theme is None or (self._task is not None and not self._task.done()):
+            return
+        if len(self._pools[self._theme]) >= self.low:
+            return
+        self._task = asyncio.get_event_loop().create_task(self._fill())
+
+    async def wait(self):
+        """Wait for a running refill to finish."""
+        if self._task is not None and not self._task.done():
+            await asyncio.shield(self._task)
+
+    async def _fill(self):
+        try:
+            while self._theme is not None:
+                theme = self._theme
+                pool = self._pools[theme]
+                if len(pool) >= self.size:
+                    return
+                entries = await self._roll(min(BATCH, self.size - len(pool)))
+                # the theme may have changed while rolling
+                if theme == self._theme:
+                    pool.extend(entries)
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            log.exception("Could not restock the cart", exc_info=exc)
+
+    def close(self):
+        self._theme = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -5,10 +5,10 @@ import random
 import re
 import typing
 from copy import copy
-from collections import OrderedDict
+from collections import Counter, OrderedDict
 from datetime import date, datetime, timedelta
 from string import ascii_letters, digits
-from typing import Dict, List, Mapping, MutableMapping, Optional, Set, Tuple
+from typing import Callable, Dict, List, Mapping, MutableMapping, Optional, Sequence, Set, Tuple
 
 import discord
 from discord.ext.commands import check
@@ -52,6 +52,22 @@ LEGENDARY_CLOSE = r"'}"
 SET_OPEN = r"{Set:'"
 EVENT_OPEN = r"{Event:'"
 
+# characters str(item) adds around the item name, per rarity
+_NAME_DECORATION = {
+    "rare": 1,
+    "epic": 2,
+    "legendary": len(LEGENDARY_OPEN) + len(LEGENDARY_CLOSE),
+    "ascended": len(ASC_OPEN) + 2 + len(LEGENDARY_CLOSE),
+    "set": len(SET_OPEN) + 2 + len(LEGENDARY_CLOSE),
+    "forged": len(TINKER_OPEN) + len(TINKER_CLOSE),
+    "event": len(EVENT_OPEN) + 2 + len(LEGENDARY_CLOSE),
+}
+
+
+def name_width(item) -> int:
+    """``len(str(item))``, without formatting the name."""
+    return len(item.name) + _NAME_DECORATION.get(item.rarity, 0)
+
 TIME_RE_STRING = r"\s?".join(
     [
         r"((?P<days>\d+?)\s?(d(ays?)?))?",
@@ -402,6 +418,7 @@ class GameSession:
     monster: dict
     message_id: int
     reacted: bool = False
+    needs_reconcile: bool = False
     participants: Set[discord.Member] = set()
     monster_modified_stats: MutableMapping = {}
     rage: Set[discord.Member] = []
@@ -440,9 +457,100 @@ class GameSession:
         self.rant: Set[discord.Member] = set()
         self.pray: Set[discord.Member] = set()
         self.run: Set[discord.Member] = set()
+        # user id -> action emojis the user currently has on the adventure message, oldest first
+        self.reactions: MutableMapping[int, List[str]] = {}
+        self.needs_reconcile: bool = False
         self.transcended: bool = kwargs.pop("transcended", False)
         self.start_time = datetime.now()
 
+    def _set_action(self, user: discord.Member, action: Optional[str]):
+        for x in ("rage", "autoaim", "rant", "pray", "run"):
+            getattr(self, x).discard(user)
+        if action is not None:
+            getattr(self, action).add(user)
+
+    def add_reaction(self, user: discord.Member, action: str):
+        """Record a join reaction; the most recent reaction decides the user's action."""
+        reactions = self.reactions.setdefault(user.id, [])
+        if action in reactions:
+            reactions.remove(action)
+        reactions.append(action)
+        self._set_action(user, action)
+
+    def remove_reaction(self, user: discord.Member, action: str):
+        """Forget a join reaction; users left without any reaction are treated as running away."""
+        reactions = self.reactions.get(user.id, [])
+        if action in reactions:
+            reactions.remove(action)
+        self._set_action(user, reactions[-1] if reactions else "run")
+
+    def to_json(self) -> dict:
+        return {
+            "challenge": self.challenge,
+            "attribute": self.attribute,
+            "guild": self.guild.id,
+            "channel": self.channel.id,
+            "boss": self.boss,
+            "miniboss": self.miniboss,
+            "timer": self.timer,
+            "timeout": getattr(self, "timeout", self.timer),
+            "monster": self.monster,
+            "monster_stats": self.monster_stats,
+            "monster_modified_stats": self.monster_modified_stats,
+            "transcended": self.transcended,
+            "message": self.message.id,
+            "countdown_message": getattr(self.countdown_message, "id", None),
+            "start_time": self.start_time.timestamp(),
+            "reacted": self.reacted,
+            "adv_ping": self.adv_ping,
+            "boss_ping": self.boss_ping,
+            "reactions": {str(u.id): list(self.reactions.get(u.id, [])) for u in self.reactors if u is not None},
+        }
+
+    @classmethod
+    def from_json(cls, bot, data: dict) -> Optional["GameSession"]:
+        """Rebuild a session from :meth:`to_json` using only the bot's cache.
+
+        Messages are restored as partial messages, so no API calls are made.
+        Returns ``None`` if the channel is gone.
+        """
+        channel = bot.get_channel(data["channel"])
+        if channel is None:
+            return None
+        session = cls(
+            challenge=data["challenge"],
+            attribute=data["attribute"],
+            channel=channel,
+            boss=data["boss"],
+            miniboss=data["miniboss"],
+            timer=data["timer"],
+            monster=data["monster"],
+            monster_stats=data["monster_stats"],
+            monster_modified_stats=data["monster_modified_stats"],
+            message=channel.get_partial_message(data["message"]),
+            transcended=data["transcended"],
+        )
+        session.timeout = data["timeout"]
+        session.message_id = data["message"]
+        if data["countdown_message"]:
+            session.countdown_message = channel.get_partial_message(data["countdown_message"])
+        session.start_time = datetime.fromtimestamp(data["start_time"])
+        session.reacted = data["reacted"]
+        session.adv_ping = data["adv_ping"]
+        session.boss_ping = data["boss_ping"]
+        for (user_id, actions) in data.get("reactions", {}).items():
+            user = session.guild.get_member(int(user_id))
+            if user is None:
+                continue
+            session.reactors.add(user)
+            for action in actions:
+                session.add_reaction(user, action)
+            if not actions:
+                session.remove_reaction(user, "run")
+        # reaction events that happened while we were offline were never seen
+        session.needs_reconcile = True
+        return session
+
     def __getstate__(self):
         state = self.__dict__.copy()
         state['channel'] = state['channel'].id
@@ -451,6 +559,7 @@ class GameSession:
         state['autoaim'] = {i.id for i in state['autoaim']}
         state['rant'] = {i.id for i in state['rant']}
         state['pray'] = {i.id for i in state['pray']}
+        state['run'] = {i.id for i in state['run']}
         state['reactors'] = {i.id for i in state['reactors']}
         state['participants'] = {i.id for i in state['participants']}
         state['channel'] = state['message'].channel.id
@@ -465,11 +574,15 @@ class GameSession:
         self.autoaim = {self.guild.get_member(i) for i in self.autoaim}
         self.rant = {self.guild.get_member(i) for i in self.rant}
         self.pray = {self.guild.get_member(i) for i in self.pray}
+        self.run = {self.guild.get_member(i) for i in self.run}
+        self.reactions = getattr(self, "reactions", {})
+        # reaction events that happened while we were offline were never seen
+        self.needs_reconcile = True
         self.reactors = {self.guild.get_member(i) for i in self.reactors}
         self.participants = {self.guild.get_member(i) for i in self.participants}
 
-        self.message = await self.channel.fetch_message(self.message)
-        self.countdown_message = await self.channel.fetch_message(self.countdown_message)
+        self.message = self.channel.get_partial_message(self.message)
+        self.countdown_message = self.channel.get_partial_message(self.countdown_message)
 
     @property
     def fmt_attribute(self):
@@ -479,6 +592,135 @@ class GameSession:
         else:
             return 'a ' + self.attribute
 
+
+class Loadout:
+    """A saved loadout, parsed into the items it holds.
+
+    ``targets`` maps every slot to the backpack name of the item saved in it,
+    so equipping the loadout is one lookup per slot. The stat totals and the
+    display text come from the same parse.
+    """
+
+    def __init__(self, data: Mapping[str, dict]):
+        self.entries: List[Tuple[str, Optional[str], Optional[Item]]] = []
+        self.targets: Dict[str, Optional[Tuple[str, str]]] = {}
+        for (slot, item_data) in data.items():
+            if slot == "backpack":
+                continue
+            if not item_data:
+                self.entries.append((slot, None, None))
+                self.targets[slot] = None
+                continue
+            key = "".join(item_data.keys())
+            self.entries.append((slot, key, Item.from_json(item_data)))
+            # (name it was saved under, name it is kept under in the backpack)
+            self.targets[slot] = (key, Item.remove_markdowns(key))
+
+        self.stats = [0, 0, 0, 0, 0]
+        for (_, _, item) in self._shown():
+            if item is not None:
+                mult = 1 if len(item.slot) < 2 else 2
+                for (i, value) in enumerate((item.att, item.cha, item.int, item.dex, item.luck)):
+                    self.stats[i] += value * mult
+
+    def _shown(self):
+        # a two handed item is listed once, under the first of its slots
+        last_slot = ""
+        for (slot, key, item) in self.entries:
+            if last_slot == "two handed":
+                last_slot = slot
+                continue
+            if item is None:
+                last_slot = slot
+            else:
+                last_slot = item.slot[0] if len(item.slot) < 2 else "two handed"
+            yield slot, key, item
+
+    def render(self, loadout: bool = True) -> str:
+        form_string = _("( RAGE  |  RANT  |  ACC  |  DEX  |  LUCK)")
+        form_string += _("\n\nItems Equipped:") if loadout else ""
+        for (slot, key, item) in self._shown():
+            if item is None:
+                form_string += _("\n\n {} slot").format(slot.title())
+                continue
+            slot_name = item.slot[0] if len(item.slot) < 2 else _("two handed")
+            form_string += _("\n\n {} slot").format(slot_name.title())
+            mult = 1 if len(item.slot) < 2 else 2
+            form_string += f"\n  - {str(item):<{len(key)}} - "
+            form_string += (
+                f"({item.att * mult} | {item.cha * mult} | {item.int * mult} | {item.dex * mult} | {item.luck * mult})"
+            )
+        form_string += _("\n\nTotal stats: ")
+        form_string += "({} | {} | {} | {} | {})".format(*self.stats)
+        return form_string + "\n"
+
+
+class Backpack(dict):
+    """A character's backpack, indexing the set pieces in it as entries are added and removed.
+
+    Stack sizes change in place through ``item.owned`` all over the cog, so the
+    total number of pieces is summed over the indexed set pieces when asked for;
+    the number of distinct pieces per set is kept as a running count.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.set_pieces: Dict[str, Item] = {}
+        self.unique_per_set: typing.Counter[str] = Counter()
+        self.update(*args, **kwargs)
+
+    def _index(self, key: str, item: Item):
+        if item.rarity == "set":
+            self.set_pieces[key] = item
+            if item.set:
+                self.unique_per_set[item.set] += 1
+
+    def _unindex(self, key: str):
+        item = self.set_pieces.pop(key, None)
+        if item is not None and item.set:
+            self.unique_per_set[item.set] -= 1
+            if self.unique_per_set[item.set] <= 0:
+                del self.unique_per_set[item.set]
+
+    def __setitem__(self, key: str, item: Item):
+        self._unindex(key)
+        super().__setitem__(key, item)
+        self._index(key, item)
+
+    def __delitem__(self, key: str):
+        super().__delitem__(key)
+        self._unindex(key)
+
+    def pop(self, key: str, *default):
+        self._unindex(key)
+        return super().pop(key, *default)
+
+    def popitem(self):
+        key, item = super().popitem()
+        self._unindex(key)
+        return key, item
+
+    def clear(self):
+        super().clear()
+        self.set_pieces.clear()
+        self.unique_per_set.clear()
+
+    def update(self, *args, **kwargs):
+        for (key, item) in dict(*args, **kwargs).items():
+            self[key] = item
+
+    def setdefault(self, key: str, default: Item = None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self) -> "Backpack":
+        return Backpack(self)
+
+    def set_piece_total(self) -> int:
+        return sum(item.owned for item in self.set_pieces.values())
+
+
 class Character(Item):
     """An class to represent the characters stats."""
 
@@ -497,7 +739,7 @@ class Character(Item):
         self.right: Item = kwargs.pop("right")
         self.ring: Item = kwargs.pop("ring")
         self.charm: Item = kwargs.pop("charm")
-        self.backpack: dict = kwargs.pop("backpack")
+        self.backpack: Backpack = Backpack(kwargs.pop("backpack"))
         self.loadouts: dict = kwargs.pop("loadouts")
         self.heroclass: dict = kwargs.pop("heroclass")
         self.skill: dict = kwargs.pop("skill")
@@ -511,7 +753,6 @@ class Character(Item):
         self.get_set_bonus()
         self.maxlevel = self.get_max_level()
         self.lvl = self.lvl if self.lvl < self.maxlevel else self.maxlevel
-        self.set_items = self.get_set_item_count()
         self.att, self._att = self.get_stat_value("att")
         self.cha, self._cha = self.get_stat_value("cha")
         self.int, self._int = self.get_stat_value("int")
@@ -830,37 +1071,7 @@ class Character(Item):
             return 0  # common / normal
 
     async def get_sorted_backpack(self, backpack: dict, slot=None, rarity=None, sort_order=None):
-        tmp = {}
-
-        def _sort(item):
-            if sort_order:
-                sorting_item = getattr(item[1], sort_order, None)
-            else:
-                sorting_item = None
-
-            return sorting_item, self.get_item_rarity(item), item[1].lvl, item[1].total_stats
-
-        async for item in AsyncIter(backpack, steps=5):
-            slots = backpack[item].slot
-            slot_name = slots[0]
-            if len(slots) > 1:
-                slot_name = "two handed"
-            if slot is not None and slot_name != slot:
-                continue
-            if rarity is not None and rarity != backpack[item].rarity:
-                continue
-
-            if slot_name not in tmp:
-                tmp[slot_name] = []
-            tmp[slot_name].append((item, backpack[item]))
-
-        final = []
-        async for (idx, slot_name) in AsyncIter(tmp.keys()).enumerate():
-            if tmp[slot_name]:
-                final.append(sorted(tmp[slot_name], key=_sort, reverse=True))
-
-        final.sort(key=lambda i: ORDER.index(i[0][1].slot[0]) if len(i[0][1].slot) == 1 else ORDER.index("two handed"))
-        return final
+        return BackpackQuery(slot=slot, rarity=rarity, sort_order=sort_order).run(self, backpack)
 
     async def looted(self, how_many: int = 1) -> List[Tuple[str, int]]:
         items = [i for n, i in self.backpack.items() if i.rarity not in ["normal", "rare", "epic", "forged"]]
@@ -930,96 +1141,85 @@ class Character(Item):
         equippable=False,
         unequippable=False,
         set_name: str = None,
-        clean: bool = False,
-        sort_order: str = None
+        sort_order: str = None,
+        query: "BackpackQuery" = None,
     ):
-        if consumed is None:
-            consumed = []
-        bkpk = await self.get_sorted_backpack(self.backpack, slot=slot, rarity=rarity, sort_order=sort_order)
+        if query is None:
+            query = BackpackQuery(
+                name=name,
+                level=level,
+                degrade=degrade,
+                rarity=rarity,
+                slot=slot,
+                set_name=set_name,
+                equippable=equippable,
+                unequippable=unequippable,
+                forging=forging,
+                consumed=consumed,
+                sort_order=sort_order,
+            )
+        slot = query.slot
+        bkpk = query.run(self)
         form_string = _(
             "Items in Backpack: \n( RAGE | ACC | RANT | DEX | LUCK ) | LEVEL REQ | [DEGRADE#] | OWNED | SET (SET PIECES)"
         )
-        consumed_list = [i for i in consumed]
-        rjust = max([len(str(i[1])) + 4 for slot_group in bkpk for i in slot_group] or [1, 4])
-        async for slot_group in AsyncIter(bkpk):
-            slot_name_org = slot_group[0][1].slot
-            slot_name = slot_name_org[0] if len(slot_name_org) < 2 else "two handed"
-            if slot is not None and slot != slot_name:
-                continue
-            if clean and not slot_group:
-                continue
-            slot_string = ""
+        rjust = max([name_width(i[1]) + 4 for slot_group in bkpk for i in slot_group] or [1, 4])
+        for slot_group in bkpk:
+            slot_name = slot_group[0][1].slot[0] if len(slot_group[0][1].slot) < 2 else "two handed"
             current_equipped = getattr(self, slot_name if slot != "two handed" else "left", None)
-            async for item in AsyncIter(slot_group):
-                e_level = equip_level(self, item[1])
-
-                if name and not all(x.is_valid(item[1].name) for x in name):
-                    continue
-
-                if level and not all(x.is_valid(e_level) for x in level):
-                    continue
+            slot_string = "".join(
+                "\n" + self.format_backpack_row(item, rjust, current_equipped, show_delta) for (_, item) in slot_group
+            )
+            form_string += f"\n\n {slot_name.title()} slot\n{slot_string}"
 
-                if degrade and not all(x.is_valid(item[1].degrade) for x in degrade):
-                    continue
+        return form_string + "\n"
 
-                if forging and (item[1].rarity in ["forged", "set"] or item[1] in consumed_list):
-                    continue
-                if forging and item[1].rarity == "ascended":
-                    if self.rebirths < 30:
-                        continue
-                if rarity is not None and rarity != item[1].rarity:
-                    continue
-                if equippable and not can_equip(self, item[1]):
-                    continue
-                if unequippable and can_equip(self, item[1]):
-                    continue
-                if set_name is not None and set_name != item[1].set:
-                    continue
-                settext = ""
-                att_space = " " if len(str(item[1].att)) >= 1 else ""
-                cha_space = " " if len(str(item[1].cha)) >= 1 else ""
-                int_space = " " if len(str(item[1].int)) >= 1 else ""
-                dex_space = " " if len(str(item[1].dex)) >= 1 else ""
-                luck_space = " " if len(str(item[1].luck)) >= 1 else ""
-                owned = ""
-                if item[1].rarity in ["legendary", "event", "ascended"] and item[1].degrade >= 0:
-                    owned += f" | [{item[1].degrade}#]"
-                owned += f" | {item[1].owned}"
-                if item[1].set:
-                    settext += f" | Set `{item[1].set}` ({item[1].parts}pcs)"
-                if e_level > self.lvl:
-                    fmt_level = f"[{e_level}]"
-                else:
-                    fmt_level = f"{e_level}"
-
-                if show_delta:
-                    att = self.get_equipped_delta(current_equipped, item[1], "att")
-                    cha = self.get_equipped_delta(current_equipped, item[1], "cha")
-                    int = self.get_equipped_delta(current_equipped, item[1], "int")
-                    dex = self.get_equipped_delta(current_equipped, item[1], "dex")
-                    luck = self.get_equipped_delta(current_equipped, item[1], "luck")
-                    rjuststat = 5
-                else:
-                    att = item[1].att if len(slot_name_org) < 2 else item[1].att * 2
-                    cha = item[1].cha if len(slot_name_org) < 2 else item[1].cha * 2
-                    int = item[1].int if len(slot_name_org) < 2 else item[1].int * 2
-                    dex = item[1].dex if len(slot_name_org) < 2 else item[1].dex * 2
-                    luck = item[1].luck if len(slot_name_org) < 2 else item[1].luck * 2
-                    rjuststat = 3
-
-                stats = (
-                    f"({att_space}{att:<{rjuststat}} |"
-                    f"{int_space}{int:<{rjuststat}} |"
-                    f"{cha_space}{cha:<{rjuststat}} |"
-                    f"{dex_space}{dex:<{rjuststat}} |"
-                    f"{luck_space}{luck:<{rjuststat}})"
-                )
+    def format_backpack_row(
+        self, item: Item, rjust: int, current_equipped: Optional[Item] = None, show_delta: bool = False
+    ) -> str:
+        e_level = equip_level(self, item)
+        slot_name_org = item.slot
+        settext = ""
+        att_space = " " if len(str(item.att)) >= 1 else ""
+        cha_space = " " if len(str(item.cha)) >= 1 else ""
+        int_space = " " if len(str(item.int)) >= 1 else ""
+        dex_space = " " if len(str(item.dex)) >= 1 else ""
+        luck_space = " " if len(str(item.luck)) >= 1 else ""
+        owned = ""
+        if item.rarity in ["legendary", "event", "ascended"] and item.degrade >= 0:
+            owned += f" | [{item.degrade}#]"
+        owned += f" | {item.owned}"
+        if item.set:
+            settext += f" | Set `{item.set}` ({item.parts}pcs)"
+        if e_level > self.lvl:
+            fmt_level = f"[{e_level}]"
+        else:
+            fmt_level = f"{e_level}"
+
+        if show_delta:
+            att = self.get_equipped_delta(current_equipped, item, "att")
+            cha = self.get_equipped_delta(current_equipped, item, "cha")
+            int = self.get_equipped_delta(current_equipped, item, "int")
+            dex = self.get_equipped_delta(current_equipped, item, "dex")
+            luck = self.get_equipped_delta(current_equipped, item, "luck")
+            rjuststat = 5
+        else:
+            att = item.att if len(slot_name_org) < 2 else item.att * 2
+            cha = item.cha if len(slot_name_org) < 2 else item.cha * 2
+            int = item.int if len(slot_name_org) < 2 else item.int * 2
+            dex = item.dex if len(slot_name_org) < 2 else item.dex * 2
+            luck = item.luck if len(slot_name_org) < 2 else item.luck * 2
+            rjuststat = 3
 
-                slot_string += f"\n{str(item[1]):<{rjust}} - {stats} | Lvl {fmt_level:<5}{owned}{settext}"
-            if slot_string:
-                form_string += f"\n\n {slot_name.title()} slot\n{slot_string}"
+        stats = (
+            f"({att_space}{att:<{rjuststat}} |"
+            f"{int_space}{int:<{rjuststat}} |"
+            f"{cha_space}{cha:<{rjuststat}} |"
+            f"{dex_space}{dex:<{rjuststat}} |"
+            f"{luck_space}{luck:<{rjuststat}})"
+        )
 
-        return form_string + "\n"
+        return f"{str(item):<{rjust}} - {stats} | Lvl {fmt_level:<5}{owned}{settext}"
 
     def get_equipped_delta(self, equiped: Item, to_compare: Item, stat_name: str) -> str:
         if (equiped and len(equiped.slot) == 2) and (to_compare and len(to_compare.slot) == 2):
@@ -1067,30 +1267,32 @@ class Character(Item):
             else:
                 self.backpack[item.name] = item
 
+    def get_loadout(self, loadout_name: str) -> Loadout:
+        """The parsed form of a saved loadout."""
+        return Loadout(self.loadouts[loadout_name])
+
     async def equip_loadout(self, loadout_name):
-        loadout = self.loadouts[loadout_name]
-        for (slot, item) in loadout.items():
-            name_unformatted = "".join(item.keys())
-            name = Item.remove_markdowns(name_unformatted)
-            current = getattr(self, slot)
-            if current and current.name == name_unformatted:
+        loadout = self.get_loadout(loadout_name)
+        # work out the whole change first, then apply it in one go
+        wanted = {}
+        for (slot, target) in loadout.targets.items():
+            current = getattr(self, slot, None)
+            if target is None:
+                wanted[slot] = None
                 continue
-            if current and current.name != name_unformatted:
-                await self.unequip_item(current)
-            if name not in self.backpack:
-                setattr(self, slot, None)
-            else:
-                if item.get("rarity", "common") == "event":
-                    equiplevel = item.get(
-                        "lvl", max((item.get("lvl", 1) - min(max(self.rebirths // 2 - 1, 0), 50)), 1),
-                    )
-                else:
-                    equiplevel = max((item.get("lvl", 1) - min(max(self.rebirths // 2 - 1, 0), 50)), 1)
-                if equiplevel > self.lvl:
-                    continue
-
-                await self.equip_item(self.backpack[name], True)
+            saved_name, backpack_name = target
+            if current and current.name == saved_name:
+                wanted[slot] = current
+                continue
+            wanted[slot] = self.backpack.get(backpack_name)
 
+        for (slot, item) in wanted.items():
+            current = getattr(self, slot, None)
+            if current and current is not item:
+                await self.unequip_item(current)
+        for (slot, item) in wanted.items():
+            if item is not None and getattr(self, slot, None) is not item:
+                await self.equip_item(item, True)
         return self
 
     @staticmethod
@@ -1226,25 +1428,28 @@ class Character(Item):
         hero_data["last_currency_check"] = data.get("last_currency_check", 0)
         return cls(**hero_data, daily_bonus_mapping=daily_bonus_mapping)
 
+    @property
+    def set_items(self) -> int:
+        """Set pieces owned, equipped or in the backpack; a two handed piece counts for both hands."""
+        equipped = sum(
+            1 for slot in ORDER if slot != "two handed" and getattr(self, slot) and getattr(self, slot).rarity == "set"
+        )
+        return equipped + self.backpack.set_piece_total()
+
     def get_set_item_count(self):
-        count_set = 0
-        last_slot = ""
-        for slots in ORDER:
-            if slots == "two handed":
-                continue
-            if last_slot == "two handed":
-                last_slot = slots
+        return self.set_items
+
+    def set_pieces(self) -> Dict[str, int]:
+        """Distinct pieces owned per set name, counting an item equipped and in the backpack once."""
+        counts = Counter(self.backpack.unique_per_set)
+        seen = set()
+        for item in self.get_current_equipment():
+            if not item.set or item.name in seen:
                 continue
-            item = getattr(self, slots)
-            if item is None:
-                continue
-            if item.rarity in ["set"]:
-                count_set += 1
-        for (k, v) in self.backpack.items():
-            for (n, i) in v.to_json().items():
-                if i.get("rarity", False) in ["set"]:
-                    count_set += v.owned
-        return count_set
+            seen.add(item.name)
+            if item.name not in self.backpack.set_pieces:
+                counts[item.set] += 1
+        return dict(counts)
 
     async def to_json(self, config) -> dict:
         backpack = {}
@@ -1287,6 +1492,7 @@ class Character(Item):
             "skill": self.skill,
             "rebirths": self.rebirths,
             "set_items": self.set_items,
+            "set_pieces": self.set_pieces(),
             "last_skill_reset": self.last_skill_reset,
             "last_known_currency": self.last_known_currency,
         }
@@ -1297,7 +1503,10 @@ class Character(Item):
         else:
             self.rebirths = dev_val
         self.keep_equipped()
-        backpack = {}
+        # equipped pieces are put in the backpack below without being unequipped, so count them first
+        set_items = self.set_items
+        set_pieces = self.set_pieces()
+        kept = {id(getattr(self, slot)) for (slot, data) in self.pieces_to_keep.items() if data}
         for item in [
             self.head,
             self.chest,
@@ -1311,24 +1520,30 @@ class Character(Item):
             self.charm,
             self.neck,
         ]:
-            if item and item.to_json() not in list(self.pieces_to_keep.values()):
+            if item and id(item) not in kept:
                 await self.add_to_backpack(item)
+        # decide on the item itself and only serialise what survives the rebirth
+        backpack = {}
         forged = 0
-        for (k, v) in self.backpack.items():
-            for (n, i) in v.to_json().items():
-                if i.get("degrade", 0) == -1 and i.get("rarity", "common") == "event":
-                    backpack[n] = i
-                elif i.get("rarity", False) in ["set", "forged"] or str(v) in [".mirror_shield"]:
-                    if i.get("rarity", False) in ["forged"]:
-                        if forged > 0:
-                            continue
-                        forged += 1
-                    backpack[n] = i
-                elif self.rebirths < 50 and i.get("rarity", False) in ["legendary", "event", "ascended"]:
-                    if "degrade" in i:
-                        i["degrade"] -= 1
-                        if i.get("degrade", 0) >= 0:
-                            backpack[n] = i
+        for item in self.backpack.values():
+            rarity = item.rarity
+            if rarity == "event" and item.degrade == -1:
+                pass
+            elif rarity in ("set", "forged") or (rarity == "rare" and str(item) == ".mirror_shield"):
+                if rarity == "forged":
+                    if forged > 0:
+                        continue
+                    forged += 1
+            elif self.rebirths < 50 and rarity in ("legendary", "event", "ascended"):
+                if item.degrade < 1:
+                    continue
+                data = item.to_json()[item.name]
+                data["degrade"] -= 1
+                backpack[item.name] = data
+                continue
+            else:
+                continue
+            backpack.update(item.to_json())
 
         tresure = [0, 0, 0, 0, 0, 0]
         if self.rebirths >= 15:
@@ -1369,7 +1584,8 @@ class Character(Item):
             "heroclass": self.heroclass,
             "skill": {"pool": 0, "att": 0, "cha": 0, "int": 0},
             "rebirths": self.rebirths,
-            "set_items": self.set_items,
+            "set_items": set_items,
+            "set_pieces": set_pieces,
             "last_known_currency": 0,
             "last_currency_check": 0,
         }
@@ -1388,40 +1604,16 @@ class Character(Item):
         self.pieces_to_keep = items_to_keep
 
     async def get_set_count(self):
-        """Source: https://github.com/aikaterna/gobcog/blob/ad33263e3c3e6cf9b2a4b98dc456dfb24969b270/adventure/charsheet.py#L566"""
-
+        """Return ``{set name: (parts in the set, distinct parts owned)}`` for every set."""
         set_names = {}
-        item_names = set()
-        last_slot = ""
-        for slots in ORDER:
-            if slots == "two handed":
-                continue
-            if last_slot == "two handed":
-                last_slot = slots
-                continue
-            item = getattr(self, slots)
-            if item is None or item.name in item_names:
-                continue
+        for item in self.get_current_equipment():
             if item.set and item.set not in set_names:
-                item_names.add(item.name)
-                set_names.update({item.set: (item.parts, 1)})
-            elif item.set and item.set in set_names:
-                item_names.add(item.name)
-                parts, count = set_names[item.set]
-                set_names[item.set] = (parts, count + 1)
-        async for item in AsyncIter(self.backpack, steps=100):
-            item = self.backpack[item]
-            if item.rarity != "set":
-                continue
-            if item.name in item_names:
-                continue
+                set_names[item.set] = item.parts
+        for item in self.backpack.set_pieces.values():
             if item.set and item.set not in set_names:
-                item_names.add(item.name)
-                set_names.update({item.set: (item.parts, 1)})
-            elif item.set and item.set in set_names:
-                item_names.add(item.name)
-                parts, count = set_names[item.set]
-                set_names[item.set] = (parts, count + 1)
+                set_names[item.set] = item.parts
+        owned = self.set_pieces()
+        set_names = {name: (parts, owned.get(name, 0)) for (name, parts) in set_names.items()}
         for set_name in SET_BONUSES:
             if set_name in set_names:
                 continue
@@ -1950,6 +2142,145 @@ def can_equip(char: Character, item: Item):
     return char.lvl >= equip_level(char, item)
 
 
+class BackpackQuery:
+    """A backpack filter and sort, shared by every command that lists or sells items.
+
+    :meth:`compile` turns the filters into a list of checks holding only the ones
+    that were asked for, with the cheap field comparisons first. Sorting is
+    applied per slot group, so only the matching items are ever sorted.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: Sequence = (),
+        level: Sequence = (),
+        degrade: Sequence = (),
+        rarity: str = None,
+        slot: str = None,
+        set_name: str = None,
+        equippable: bool = False,
+        unequippable: bool = False,
+        forging: bool = False,
+        consumed: Sequence[Item] = (),
+        exclude_rarities: Sequence[str] = (),
+        sort_order: str = None,
+    ):
+        self.name = list(name or ())
+        self.level = list(level or ())
+        self.degrade = list(degrade or ())
+        self.rarity = rarity
+        self.slot = slot
+        self.set_name = set_name
+        self.equippable = equippable
+        self.unequippable = unequippable
+        self.forging = forging
+        self.consumed = list(consumed or ())
+        self.exclude_rarities = frozenset(exclude_rarities)
+        self.sort_order = sort_order
+
+    def compile(self, char: Character) -> Callable[[Item], bool]:
+        """Return a predicate for ``char``'s items, with the character's modifiers worked out once."""
+        checks = []
+        if self.slot is not None:
+            if self.slot == "two handed":
+                # forged two handers and some set pieces list their hands as ["right", "left"]
+                checks.append(lambda item: len(item.slot) == 2)
+            else:
+                wanted = [self.slot]
+                checks.append(lambda item: item.slot == wanted)
+        if self.rarity is not None:
+            checks.append(lambda item: item.rarity == self.rarity)
+        if self.exclude_rarities:
+            checks.append(lambda item: item.rarity not in self.exclude_rarities)
+        if self.set_name is not None:
+            checks.append(lambda item: item.set == self.set_name)
+        if self.forging:
+            checks.append(lambda item: item.rarity not in ("forged", "set"))
+            if self.consumed:
+                consumed = {id(i) for i in self.consumed}
+                checks.append(lambda item: id(item) not in consumed)
+            if char.rebirths < 30:
+                checks.append(lambda item: item.rarity != "ascended")
+        if self.name:
+            checks.append(self._compile_names(self.name))
+        if self.degrade:
+            checks.append(lambda item: all(f.is_valid(item.degrade) for f in self.degrade))
+
+        if self.level or self.equippable or self.unequippable:
+            reduction = min(max(char.rebirths // 2 - 1, 0), 50)
+
+            def level_of(item: Item) -> int:
+                return item.lvl if item.rarity == "event" else max(item.lvl - reduction, 1)
+
+            if self.level:
+                checks.append(lambda item: all(f.is_valid(level_of(item)) for f in self.level))
+            # same as can_equip, without looking the character up again for every item
+            dev = char.user.id in DEV_LIST
+            if self.equippable and not dev:
+                checks.append(lambda item: char.lvl >= level_of(item))
+            if self.unequippable:
+                checks.append((lambda item: False) if dev else (lambda item: char.lvl < level_of(item)))
+
+        if not checks:
+            return lambda item: True
+        if len(checks) == 1:
+            return checks[0]
+        return lambda item: all(check(item) for check in checks)
+
+    @staticmethod
+    def _compile_names(filters: Sequence) -> Callable[[Item], bool]:
+        included = [f.val.lower() for f in filters if f.sign == "+"]
+        excluded = [f.val.lower() for f in filters if f.sign == "-"]
+        if len(included) + len(excluded) != len(filters):
+            return lambda item: all(f.is_valid(item.name) for f in filters)
+
+        def check(item: Item) -> bool:
+            name = item.name.lower()
+            return all(val in name for val in included) and not any(val in name for val in excluded)
+
+        return check
+
+    def sort_key(self) -> Callable[[Tuple[str, Item]], tuple]:
+        sort_order = self.sort_order
+
+        def key(entry: Tuple[str, Item]) -> tuple:
+            item = entry[1]
+            return (
+                getattr(item, sort_order, None) if sort_order else None,
+                Character.get_item_rarity(entry),
+                item.lvl,
+                item.total_stats,
+            )
+
+        return key
+
+    def select(self, char: Character, backpack: Mapping[str, Item] = None) -> List[Item]:
+        """Matching items in backpack order."""
+        matches = self.compile(char)
+        backpack = char.backpack if backpack is None else backpack
+        return [item for item in backpack.values() if matches(item)]
+
+    def run(self, char: Character, backpack: Mapping[str, Item] = None) -> List[List[Tuple[str, Item]]]:
+        """Matching ``(name, item)`` pairs grouped per slot in ``ORDER``, each group best first."""
+        matches = self.compile(char)
+        backpack = char.backpack if backpack is None else backpack
+        groups: Dict[str, List[Tuple[str, Item]]] = {}
+        for (name, item) in backpack.items():
+            if matches(item):
+                slot_name = item.slot[0] if len(item.slot) == 1 else "two handed"
+                groups.setdefault(slot_name, []).append((name, item))
+
+        key = self.sort_key()
+        result = []
+        for slot_name in ORDER:
+            group = groups.get(slot_name)
+            if group:
+                group.sort(key=key, reverse=True)
+                result.append(group)
+        return result
+
+
 async def calculate_sp(lvl_end: int, c: Character):
     points = c.rebirths * 10
     async for rc in AsyncIter(range(lvl_end)):
@@ -0,0 +1,174 @@
+import random
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from .charsheet import ORDER, RARITIES
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+STATS = ("att", "cha", "int", "dex", "luck")
+_ZERO = (0,) * len(STATS)
+
+RARE_INDEX = RARITIES.index("rare")
+EPIC_INDEX = RARITIES.index("epic")
+PREFIX_CHANCE = {"rare": 0.5, "epic": 0.75, "legendary": 0.9, "ascended": 1.0, "set": 0}
+SUFFIX_CHANCE = {"epic": 0.5, "legendary": 0.75, "ascended": 0.5}
+
+# below this many items the per-item path is cheaper than setting up the arrays
+VECTOR_THRESHOLD = 256
+
+Word = Tuple[str, Tuple[int, ...]]
+
+
+def _vector(word_stats: Mapping) -> Tuple[int, ...]:
+    return tuple(word_stats.get(stat, 0) for stat in STATS)
+
+
+def _add(a: Tuple[int, ...], b: Tuple[int, ...]) -> Tuple[int, ...]:
+    return tuple(x + y for (x, y) in zip(a, b))
+
+
+class ItemTables:
+    """The theme's item words, compiled once when the theme is loaded.
+
+    Every word is stored with its stats as a vector in ``STATS`` order, so
+    generating an item is a handful of index draws and vector additions.
+    Set pieces are pre-filtered per slot.
+    """
+
+    def __init__(self, prefixes: dict, materials: dict, equipment: dict, suffixes: dict, gear_set: dict):
+        self.prefixes: Tuple[Word, ...] = tuple((f"{name} ", _vector(stats)) for (name, stats) in prefixes.items())
+        self.suffixes: Tuple[Word, ...] = tuple(
+            (f" {'of the' if 'the' in stats else 'of'} {name}", _vector(stats)) for (name, stats) in suffixes.items()
+        )
+        # a material adds its value to every stat
+        self.materials: Dict[str, Tuple[Word, ...]] = {
+            rarity: tuple((f"{name} ", (value,) * len(STATS)) for (name, value) in words.items())
+            for (rarity, words) in materials.items()
+        }
+        self.equipment: Dict[str, Tuple[Word, ...]] = {
+            slot: tuple((name, _vector(stats)) for (name, stats) in words.items())
+            for (slot, words) in equipment.items()
+        }
+        gear = tuple(gear_set.items())
+        self.sets: Dict[Optional[str], Tuple[Tuple[str, dict], ...]] = {None: gear}
+        for slot in ORDER:
+            slot_list = ["left", "right"] if slot == "two handed" else [slot]
+            self.sets[slot] = tuple(i for i in gear if i[1]["slot"] == slot_list)
+
+        if numpy is not None:
+            # row 0 of the prefix and suffix arrays stands for "no word"
+            self._prefix_stats = numpy.array([_ZERO] + [v for (_, v) in self.prefixes], dtype=numpy.int64)
+            self._suffix_stats = numpy.array([_ZERO] + [v for (_, v) in self.suffixes], dtype=numpy.int64)
+            self._material_stats = {
+                k: numpy.array([v for (_, v) in words], dtype=numpy.int64).reshape(-1, len(STATS))
+                for (k, words) in self.materials.items()
+            }
+            self._equipment_stats = {
+                k: numpy.array([v for (_, v) in words], dtype=numpy.int64).reshape(-1, len(STATS))
+                for (k, words) in self.equipment.items()
+            }
+
+    def roll(self, rarity: str, slot: Optional[str] = None) -> Tuple[str, str, Tuple[int, ...]]:
+        """Draw the words for one item, returning its name, slot and stats vector.
+
+        ``rarity`` must not be ``"set"``; those come straight from :attr:`sets`.
+        """
+        if slot is None:
+            slot = random.choice(ORDER)
+        name = ""
+        stats = _ZERO
+        # only rare and above should have prefix with PREFIX_CHANCE
+        if RARITIES.index(rarity) >= RARE_INDEX and random.random() <= PREFIX_CHANCE[rarity]:
+            word, word_stats = random.choice(self.prefixes)
+            name += word
+            stats = word_stats
+        word, word_stats = random.choice(self.materials[rarity])
+        name += word
+        stats = _add(stats, word_stats)
+        word, word_stats = random.choice(self.equipment[slot])
+        name += word
+        stats = _add(stats, word_stats)
+        # only epic and above should have suffix with SUFFIX_CHANCE
+        if RARITIES.index(rarity) >= EPIC_INDEX and random.random() <= SUFFIX_CHANCE[rarity]:
+            word, word_stats = random.choice(self.suffixes)
+            name += word
+            stats = _add(stats, word_stats)
+        return name, slot, stats
+
+    def generate(
+        self, rarity: str, count: int, slot: Optional[str] = None
+    ) -> List[Tuple[str, str, Tuple[int, ...], int]]:
+        """Draw ``count`` items of ``rarity`` at once.
+
+        Returns one ``(name, slot, stats, copies)`` entry per distinct item.
+        Large batches are drawn as NumPy arrays when NumPy is installed, with
+        names built only for the distinct results; the distribution is the
+        same as calling :meth:`roll` ``count`` times.
+        """
+        if numpy is None or count < VECTOR_THRESHOLD:
+            found = {}
+            for _ in range(count):
+                name, item_slot, stats = self.roll(rarity, slot)
+                entry = found.get(name)
+                if entry is None:
+                    found[name] = [name, item_slot, stats, 1]
+                else:
+                    entry[3] += 1
+            return [tuple(entry) for entry in found.values()]
+        return self._generate_arrays(rarity, count, slot)
+
+    def _generate_arrays(self, rarity: str, count: int, slot: Optional[str]):
+        # seeded from ``random`` so seeding that module still makes runs reproducible
+        rng = numpy.random.default_rng(random.getrandbits(64))
+        rank = RARITIES.index(rarity)
+        if slot is None:
+            per_slot = numpy.bincount(rng.integers(len(ORDER), size=count), minlength=len(ORDER))
+            groups = [(ORDER[i], int(n)) for (i, n) in enumerate(per_slot) if n]
+        else:
+            groups = [(slot, count)]
+
+        materials = self.materials[rarity]
+        results = []
+        for (item_slot, n) in groups:
+            equipment = self.equipment[item_slot]
+            prefix = numpy.zeros(n, dtype=numpy.int64)
+            if rank >= RARE_INDEX:
+                has_prefix = rng.random(n) <= PREFIX_CHANCE[rarity]
+                prefix = numpy.where(has_prefix, rng.integers(len(self.prefixes), size=n) + 1, 0)
+            material = rng.integers(len(materials), size=n)
+            equip = rng.integers(len(equipment), size=n)
+            suffix = numpy.zeros(n, dtype=numpy.int64)
+            if rank >= EPIC_INDEX:
+                has_suffix = rng.random(n) <= SUFFIX_CHANCE[rarity]
+                suffix = numpy.where(has_suffix, rng.integers(len(self.suffixes), size=n) + 1, 0)
+
+            # one integer per combination of words, so duplicates collapse in a single pass
+            code = ((prefix * len(materials) + material) * len(equipment) + equip) * (len(self.suffixes) + 1) + suffix
+            codes, copies = numpy.unique(code, return_counts=True)
+            rest, suffix = numpy.divmod(codes, len(self.suffixes) + 1)
+            rest, equip = numpy.divmod(rest, len(equipment))
+            prefix, material = numpy.divmod(rest, len(materials))
+            stats = (
+                self._prefix_stats[prefix]
+                + self._material_stats[rarity][material]
+                + self._equipment_stats[item_slot][equip]
+                + self._suffix_stats[suffix]
+            )
+            for (p, m, e, s, vector, copies_) in zip(
+                prefix.tolist(), material.tolist(), equip.tolist(), suffix.tolist(), stats.tolist(), copies.tolist()
+            ):
+                name = (self.prefixes[p - 1][0] if p else "") + materials[m][0] + equipment[e][0]
+                if s:
+                    name += self.suffixes[s - 1][0]
+                results.append((name, item_slot, tuple(vector), copies_))
+        return results
+
+    def set_pieces(self, slot: Optional[str] = None) -> Tuple[Tuple[str, dict], ...]:
+        return self.sets[slot] if slot in self.sets else ()
+
+
+def slot_list(slot: str) -> List[str]:
+    return [slot] if slot != "two handed" else ["left", "right"]
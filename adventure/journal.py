@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, MutableMapping, Tuple
+
+log = logging.getLogger("red.cogs.adventure.journal")
+
+
+class SessionJournal:
+    """Append-only record of running adventures and recent results.
+
+    Every change is written as one JSON line as soon as it happens, so a crash
+    loses at most the line being written. The first line of the file is a
+    snapshot of everything that was live at the last compaction; replaying
+    the snapshot and then the lines after it rebuilds the current state.
+
+    Line formats::
+
+        {"op": "snapshot", "sessions": [...], "results": {...}}
+        {"op": "start", "session": {...}}
+        {"op": "react" | "unreact", "channel": 1, "user": 2, "action": "rage"}
+        {"op": "end", "channel": 1}
+        {"op": "result", "channel": 1, "raid": {...}}
+
+    Each session payload in a snapshot carries its own ``reactions`` mapping
+    of user id to the actions they hold, oldest first.
+    """
+
+    def __init__(self, path: Path, compact_after: int = 2000):
+        self.path = Path(path)
+        self.compact_after = compact_after
+        self._writes = 0
+        self._fp = None
+
+    def exists(self) -> bool:
+        return self.path.is_file()
+
+    def record(self, op: str, **data):
+        """Append one line.
+
+        This writes and flushes synchronously on the event loop, deliberately:
+        the file stays open between calls and a flush without fsync only hands
+        a short line to the OS, which is cheaper than scheduling it elsewhere
+        and keeps the lines in the order the events happened.
+        """
+        data["op"] = op
+        try:
+            if self._fp is None:
+                self._fp = open(self.path, "a", encoding="utf-8")
+            self._fp.write(json.dumps(data, separators=(",", ":")) + "\n")
+            self._fp.flush()
+        except (OSError, TypeError, ValueError) as exc:
+            log.exception("Could not write to the adventure journal", exc_info=exc)
+            return
+        self._writes += 1
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self._writes >= self.compact_after
+
+    def replay(self) -> Tuple[Dict[int, dict], Dict[int, List[dict]]]:
+        """Return the sessions and raid history per channel described by the journal.
+
+        Each session is its ``GameSession.to_json`` payload with a ``reactions``
+        mapping of user id to the actions they hold, oldest first.
+        """
+        sessions: Dict[int, dict] = {}
+        results: Dict[int, List[dict]] = {}
+        if not self.exists():
+            return sessions, results
+        with open(self.path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a torn final line from a crash mid-write
+                    log.warning("Skipping unreadable adventure journal line %s", line_number)
+                    continue
+                op = entry.get("op")
+                if op == "snapshot":
+                    sessions = {s["channel"]: s for s in entry.get("sessions", [])}
+                    results = {int(k): v for k, v in entry.get("results", {}).items()}
+                elif op == "start":
+                    session = entry["session"]
+                    session.setdefault("reactions", {})
+                    sessions[session["channel"]] = session
+                elif op in ("react", "unreact"):
+                    session = sessions.get(entry["channel"])
+                    if session is None:
+                        continue
+                    reactions = session["reactions"].setdefault(str(entry["user"]), [])
+                    if entry["action"] in reactions:
+                        reactions.remove(entry["action"])
+                    if op == "react":
+                        reactions.append(entry["action"])
+                elif op == "end":
+                    sessions.pop(entry["channel"], None)
+                elif op == "result":
+                    results.setdefault(entry["channel"], []).append(entry["raid"])
+        return sessions, results
+
+    def compact(self, sessions: List[dict], results: MutableMapping[int, List[dict]]):
+        """Replace the journal with a single snapshot line."""
+        tmp = self.path.with_suffix(".tmp")
+        snapshot = {
+            "op": "snapshot",
+            "sessions": sessions,
+            "results": {str(k): v for k, v in results.items()},
+        }
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(json.dumps(snapshot, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.close()
+            os.replace(tmp, self.path)
+        except (OSError, TypeError, ValueError) as exc:
+            log.exception("Could not compact the adventure journal", exc_info=exc)
+            return
+        self._writes = 0
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
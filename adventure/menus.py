@@ -6,10 +6,11 @@ from typing import Any, Dict, List, Optional, Tuple
 import discord
 from redbot.core.commands import commands
 from redbot.core.i18n import Translator
-from redbot.core.utils.chat_formatting import escape, humanize_number
+from redbot.core.utils.chat_formatting import box, escape, humanize_number
 from redbot.vendored.discord.ext import menus
 
 from . import bank
+from .charsheet import Character, Item, name_width
 from .utils import Emojis
 
 _ = Translator("Adventure", __file__)
@@ -289,6 +290,56 @@ class EconomySource(menus.ListPageSource):
         return embed
 
 
+class BackpackSource(menus.ListPageSource):
+    """A backpack listing that formats a page only when it is shown.
+
+    Takes the slot groups from :meth:`BackpackQuery.run`. Column widths and the
+    number of rows per page come from the item names and set names, so opening
+    a huge backpack renders one page instead of the whole thing.
+    """
+
+    # what fits in a message once the title, column legend and slot headers are in
+    ROW_BUDGET = 1500
+    # a row without the item and set names: stats, level, degrade and owned count
+    ROW_OVERHEAD = 90
+
+    def __init__(
+        self, character: Character, groups: List[List[Tuple[str, Item]]], title: str, show_delta: bool = False
+    ):
+        entries = [
+            (item.slot[0] if len(item.slot) < 2 else "two handed", item) for group in groups for (_, item) in group
+        ]
+        self.rjust = max([name_width(item) + 4 for (_, item) in entries] or [1, 4])
+        longest_set = max([len(item.set) for (_, item) in entries if item.set] or [0])
+        per_page = max(1, self.ROW_BUDGET // (self.rjust + self.ROW_OVERHEAD + longest_set))
+        super().__init__(entries, per_page=per_page)
+        self.character = character
+        self.title = title
+        self.show_delta = show_delta
+
+    def get_max_pages(self):
+        # an empty backpack still gets a page saying so
+        return max(1, super().get_max_pages())
+
+    async def format_page(self, menu: menus.MenuPages, entries: List[Tuple[str, Item]]):
+        c = self.character
+        text = self.title + "\n\n"
+        text += _(
+            "Items in Backpack: \n( RAGE | ACC | RANT | DEX | LUCK ) | LEVEL REQ | [DEGRADE#] | OWNED | SET (SET PIECES)"
+        )
+        current_slot = None
+        current_equipped = None
+        for (slot_name, item) in entries:
+            if slot_name != current_slot:
+                current_slot = slot_name
+                current_equipped = getattr(c, slot_name if slot_name != "two handed" else "left", None)
+                text += f"\n\n {slot_name.title()} slot\n"
+            text += "\n" + c.format_backpack_row(item, self.rjust, current_equipped, self.show_delta)
+        if self.get_max_pages() > 1:
+            text += "\n\n" + _("Page {page}/{pages}").format(page=menu.current_page + 1, pages=self.get_max_pages())
+        return box(text + "\n", lang="css")
+
+
 class BaseMenu(menus.MenuPages, inherit_buttons=False):
     def __init__(
         self,
@@ -660,3 +711,21 @@ class LeaderboardMenu(BaseMenu, inherit_buttons=False):
         """go to the last page"""
         # The call here is safe because it's guarded by skip_if
         await self.show_page(self._source.get_max_pages() - 1)
+
+
+class BackpackMenu(BaseMenu):
+    """:class:`BaseMenu` with a button that shows the command's help, for the backpack listing."""
+
+    def __init__(self, source: menus.PageSource, show_help: bool = False, **kwargs: Any) -> None:
+        super().__init__(source, **kwargs)
+        self._show_help = show_help
+
+    def _skip_help(self):
+        return not self._show_help
+
+    @menus.button("\N{INFORMATION SOURCE}\N{VARIATION SELECTOR-16}", position=menus.Last(2), skip_if=_skip_help)
+    async def send_help(self, payload):
+        """show the command's help"""
+        self.delete_message_after = True
+        self.stop()
+        await self.ctx.send_help(self.ctx.command)
@@ -0,0 +1,378 @@
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence
+
+log = logging.getLogger("red.cogs.adventure.metrics")
+
+# 0.5ms doubling up to ~9 minutes, long enough for a whole boss fight
+LATENCY_BOUNDS = tuple(0.0005 * 2 ** i for i in range(21))
+COUNT_BOUNDS = (0,) + tuple(2 ** i for i in range(16))
+
+# Config methods, by what they do to the backing store
+_READS = frozenset({"get_raw", "all_users", "all_guilds", "all_channels", "all_members", "all_roles"})
+_WRITES = frozenset(
+    {
+        "set",
+        "set_raw",
+        "clear",
+        "clear_raw",
+        "clear_all",
+        "clear_all_users",
+        "clear_all_guilds",
+        "clear_all_channels",
+        "clear_all_members",
+        "clear_all_roles",
+    }
+)
+_FACTORIES = frozenset(
+    {
+        "user",
+        "user_from_id",
+        "guild",
+        "guild_from_id",
+        "channel",
+        "channel_from_id",
+        "member",
+        "member_from_ids",
+        "role",
+        "role_from_id",
+        "custom",
+        "get_attr",
+        "_get_base_group",
+    }
+)
+
+
+class Histogram:
+    """Fixed bucket histogram; percentiles are reported as the upper bound of their bucket."""
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, pct: float) -> float:
+        if not self.count:
+            return 0.0
+        target = pct * self.count
+        seen = 0
+        for (index, count) in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_json(self, scale: float = 1.0) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count * scale, 3) if self.count else 0.0,
+            "p50": round(self.percentile(0.50) * scale, 3),
+            "p95": round(self.percentile(0.95) * scale, 3),
+            "p99": round(self.percentile(0.99) * scale, 3),
+            "max": round(self.max * scale, 3),
+        }
+
+
+class AdventureStats:
+    """Counters for the adventure currently running in this task."""
+
+    __slots__ = ("config_reads", "config_writes", "api_calls")
+
+    def __init__(self):
+        self.config_reads = 0
+        self.config_writes = 0
+        self.api_calls = 0
+
+
+class CommandStats:
+    """Config traffic and API calls caused by one command, summed over its invocations."""
+
+    __slots__ = ("invocations", "reads", "writes", "bytes_read", "bytes_written", "api_calls")
+
+    def __init__(self):
+        self.invocations = 0
+        self.reads = 0
+        self.writes = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.api_calls = 0
+
+    def to_json(self) -> dict:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        per_call = max(self.invocations, 1)
+        data["reads_per_call"] = round(self.reads / per_call, 2)
+        data["writes_per_call"] = round(self.writes / per_call, 2)
+        data["bytes_per_call"] = round((self.bytes_read + self.bytes_written) / per_call)
+        data["api_calls_per_call"] = round(self.api_calls / per_call, 2)
+        return data
+
+
+_current: ContextVar[Optional[AdventureStats]] = ContextVar("adventure_stats", default=None)
+_command: ContextVar[Optional[CommandStats]] = ContextVar("adventure_command_stats", default=None)
+
+
+def detach():
+    """Stop attributing work done by the current task to the adventure that spawned it.
+
+    Long lived tasks started from inside an adventure, such as the countdown
+    scheduler, call this so they are not counted against that one adventure forever.
+    """
+    _current.set(None)
+
+
+def timed(phase: str):
+    """Record how long the decorated cog coroutine takes under ``phase``."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(self, *args, **kwargs)
+            finally:
+                self._metrics.observe(phase, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+class Metrics:
+    """Latency and I/O counters for the adventure lifecycle."""
+
+    def __init__(self):
+        # serialising every value read is not free, so sizes are only measured on request
+        self.measure_bytes = False
+        self.reset()
+        self._http = None
+        self._request = None
+
+    def reset(self):
+        self.started = time.time()
+        self.adventures = 0
+        self.config_reads = 0
+        self.config_writes = 0
+        self.api_calls = 0
+        self.phases: Dict[str, Histogram] = {}
+        self.commands: Dict[str, CommandStats] = {}
+        self.per_adventure: Dict[str, Histogram] = {name: Histogram(COUNT_BOUNDS) for name in AdventureStats.__slots__}
+
+    def observe(self, phase: str, seconds: float):
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = Histogram()
+        histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def adventure(self):
+        """Attribute Config and API calls made by this task and its children to one adventure."""
+        stats = AdventureStats()
+        token = _current.set(stats)
+        try:
+            yield stats
+        finally:
+            _current.reset(token)
+            self.adventures += 1
+            for name in AdventureStats.__slots__:
+                self.per_adventure[name].observe(getattr(stats, name))
+
+    def start_command(self, name: str):
+        """Attribute Config traffic from here on in this task to the command ``name``."""
+        stats = self.commands.get(name)
+        if stats is None:
+            stats = self.commands[name] = CommandStats()
+        stats.invocations += 1
+        _command.set(stats)
+
+    def end_command(self):
+        _command.set(None)
+
+    def _size(self, value) -> int:
+        if not self.measure_bytes or value is None:
+            return 0
+        try:
+            return len(json.dumps(value, separators=(",", ":")))
+        except (TypeError, ValueError):
+            return 0
+
+    def record_read(self, value=None):
+        self.config_reads += 1
+        stats = _current.get()
+        if stats is not None:
+            stats.config_reads += 1
+        command = _command.get()
+        if command is not None:
+            command.reads += 1
+            command.bytes_read += self._size(value)
+
+    def record_write(self, value=None):
+        self.config_writes += 1
+        stats = _current.get()
+        if stats is not None:
+            stats.config_writes += 1
+        command = _command.get()
+        if command is not None:
+            command.writes += 1
+            command.bytes_written += self._size(value)
+
+    def record_api_call(self):
+        stats = _current.get()
+        command = _command.get()
+        if stats is None and command is None:
+            # the HTTP client is shared by every cog; this request is not one of ours
+            return
+        self.api_calls += 1
+        if stats is not None:
+            stats.api_calls += 1
+        if command is not None:
+            command.api_calls += 1
+
+    def track_config(self, config):
+        return _TrackedConfig(config, self)
+
+    @staticmethod
+    def untrack_config(config):
+        return config._target if isinstance(config, _TrackedConfig) else config
+
+    def heaviest_commands(self, limit: int = None, key: str = "io") -> list:
+        """Return ``(name, stats)`` pairs, most Config traffic first.
+
+        ``key`` is ``"io"`` for reads plus writes, ``"bytes"`` for bytes moved,
+        or any :class:`CommandStats` field.
+        """
+        if key == "io":
+            sort_key = lambda i: i[1].reads + i[1].writes
+        elif key == "bytes":
+            sort_key = lambda i: i[1].bytes_read + i[1].bytes_written
+        else:
+            sort_key = lambda i: getattr(i[1], key)
+        ordered = sorted(self.commands.items(), key=sort_key, reverse=True)
+        return ordered if limit is None else ordered[:limit]
+
+    def install(self, http):
+        """Count the Discord HTTP requests made on behalf of an adventure or an Adventure command.
+
+        Requests made by other cogs, or by this one outside of those, pass through uncounted.
+        """
+        original = getattr(http, "request", None)
+        if original is None:
+            return
+
+        async def request(*args, **kwargs):
+            if self._request is request:
+                self.record_api_call()
+            return await original(*args, **kwargs)
+
+        self._http = http
+        self._request = request
+        http.request = request
+
+    def uninstall(self):
+        if self._http is None:
+            return
+        if self._http.__dict__.get("request") is self._request:
+            del self._http.request
+        # if someone wrapped it after us, leave their wrapper alone; ours just stops counting
+        self._request = None
+        self._http = None
+
+    def to_json(self) -> dict:
+        return {
+            "uptime_seconds": round(time.time() - self.started),
+            "adventures": self.adventures,
+            "totals": {
+                "config_reads": self.config_reads,
+                "config_writes": self.config_writes,
+                "api_calls": self.api_calls,
+            },
+            "phases_ms": {name: h.to_json(scale=1000) for (name, h) in sorted(self.phases.items())},
+            "per_adventure": {name: h.to_json() for (name, h) in self.per_adventure.items()},
+            "bytes_measured": self.measure_bytes,
+            "commands": {name: stats.to_json() for (name, stats) in self.heaviest_commands()},
+        }
+
+
+class _TrackedAccess:
+    """Wraps what ``value()`` and ``group.all()`` return, for both ``await`` and ``async with``."""
+
+    __slots__ = ("_access", "_metrics", "_value")
+
+    def __init__(self, access, metrics: Metrics):
+        self._access = access
+        self._metrics = metrics
+        self._value = None
+
+    def __await__(self):
+        return self._read().__await__()
+
+    async def _read(self):
+        value = await self._access
+        self._metrics.record_read(value)
+        return value
+
+    async def __aenter__(self):
+        self._value = await self._access.__aenter__()
+        self._metrics.record_read(self._value)
+        return self._value
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._metrics.record_write(self._value)
+        return await self._access.__aexit__(exc_type, exc, tb)
+
+
+class _TrackedConfig:
+    """Transparent proxy over a Config, Group or Value that counts reads and writes."""
+
+    __slots__ = ("_target", "_metrics")
+
+    def __init__(self, target, metrics: Metrics):
+        self._target = target
+        self._metrics = metrics
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        metrics = self._metrics
+        if name in _READS:
+
+            async def read(*args, **kwargs):
+                value = await attr(*args, **kwargs)
+                metrics.record_read(value)
+                return value
+
+            return read
+        if name in _WRITES:
+
+            async def write(*args, **kwargs):
+                metrics.record_write(kwargs.get("value", args[0] if name == "set" and args else None))
+                return await attr(*args, **kwargs)
+
+            return write
+        if name == "all":
+            return lambda *args, **kwargs: _TrackedAccess(attr(*args, **kwargs), metrics)
+        if name in _FACTORIES:
+            return lambda *args, **kwargs: _TrackedConfig(attr(*args, **kwargs), metrics)
+        if inspect.ismethod(attr) or not callable(attr):
+            return attr
+        # a child Group or Value
+        return _TrackedConfig(attr, metrics)
+
+    def __call__(self, *args, **kwargs):
+        return _TrackedAccess(self._target(*args, **kwargs), self._metrics)
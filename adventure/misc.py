@@ -1,8 +1,10 @@
 import asyncio
 import contextlib
 import copy
+import heapq
 import json
 import logging
+import math
 import os
 import pickle
 import random
@@ -10,7 +12,7 @@ import re
 import time
 import traceback
 from datetime import date, datetime, timedelta
-from typing import List, MutableMapping, Union
+from typing import List, MutableMapping, Tuple, Union
 
 import discord
 from cryptography.fernet import Fernet
@@ -29,12 +31,51 @@ from redbot.core.utils.predicates import MessagePredicate, ReactionPredicate
 import adventure.charsheet
 from . import bank
 from .charsheet import ORDER, RARITIES, Character, GameSession, Item, calculate_sp, can_equip, equip_level, has_funds
-from .utils import AdventureCheckFailure, AdventureOnCooldown, smart_embed, start_adding_reactions, MENU_CONTROLS
+from .itemgen import STATS, ItemTables, slot_list
+from .metrics import timed
+from .ranking import rank
+from .scheduler import Countdown
+from .utils import (
+    AdventureCheckFailure,
+    AdventureOnCooldown,
+    smart_embed,
+    start_adding_reactions,
+    MENU_CONTROLS,
+    multinomial,
+)
 
 DEV_LIST = [208903205982044161, 154497072148643840, 218773382617890828]
 REBIRTH_LVL = 20
 REBIRTH_STEP = 10
 _SCHEMA_VERSION = 4
+# sessions that are still around this long after they started are treated as abandoned
+_SESSION_TTL = timedelta(minutes=6)
+
+# cart stock: rarity, chance weight and base price range (multiplied by the item's main stat)
+_TRADER_ODDS = (
+    ("normal", 35, (100, 500)),  # 1 stat for normal, want to be <1k
+    ("rare", 35, (500, 1000)),  # around 3 stat for rare, want to be about 3k
+    ("epic", 25, (1000, 2000)),  # min. 5 stat for epic, want to be about 25k
+    ("legendary", 5, (2500, 5000)),  # min. 10 stat for legendary, want to be about 50k
+)
+
+# base price range per copy when selling, multiplied by the item's main stat
+_SELL_BASE = {"ascended": (5000, 10000), "legendary": (1000, 2000), "epic": (500, 750), "rare": (250, 500)}
+
+_INITIAL_MAX_ROLL = 400
+# max luck for best chest odds
+_MAX_CHEST_LUCK = 200
+# what each chest can contain: rolls up to ``bound * _INITIAL_MAX_ROLL`` give ``rarity``,
+# checked in order, with the last entry catching everything else
+_CHEST_ODDS = {
+    "normal": ((0.05, "rare"), (None, "normal")),  # 5% rare, 95% normal
+    "rare": ((0.05, "epic"), (0.95, "rare"), (None, "normal")),  # 5% epic, 90% rare, 5% normal
+    "epic": ((0.05, "legendary"), (0.90, "epic"), (None, "rare")),  # 5% legendary, 85% epic, 10% rare
+    "legendary": ((0.75, "legendary"), (0.95, "epic"), (None, "rare")),  # 75% legendary, 20% epic, 5% rare
+    "ascended": ((0.55, "ascended"), (None, "legendary")),  # 55% ascended, 45% legendary
+    "pet": ((0.05, "legendary"), (0.15, "epic"), (0.57, "rare"), (None, "normal")),
+    "set": ((0.55, "set"), (0.87, "ascended"), (None, "legendary")),  # 55% set, 32% ascended, 13% legendary
+}
 
 _ = Translator("Adventure", __file__)
 _config: Config = None
@@ -129,6 +170,9 @@ class MiscMixin(commands.Cog):
             self.EQUIPMENT = self.parse_file(files["equipment"])
             self.SUFFIXES = self.parse_file(files["suffixes"])
             self.SET_BONUSES = self.parse_file(files["set_bonuses"])
+            self._item_tables = ItemTables(
+                self.PREFIXES, self.MATERIALS, self.EQUIPMENT, self.SUFFIXES, self.TR_GEAR_SET
+            )
 
             try:
                 with open(cog_data_path(self) / "perms.json") as f:
@@ -162,112 +206,136 @@ class MiscMixin(commands.Cog):
             adventure.charsheet.REBIRTH_LVL = REBIRTH_LVL
             adventure.charsheet.REBIRTH_STEP = REBIRTH_STEP
             adventure.charsheet.SET_BONUSES = self.SET_BONUSES
+            self._cart_stock.use_theme(theme)
             await self._migrate_config(from_version=await self.config.schema_version(), to_version=_SCHEMA_VERSION)
             self._daily_bonus = await self.config.daily_bonus.all()
 
             await self.bot.wait_until_ready()
             
-            results_path = cog_data_path(self) / "results.pickle"
-            if os.path.isfile(results_path):
-                with open(results_path, "rb") as f:
-                    try:
-                        self._adv_results = pickle.load(f)
-                    except EOFError:
-                        pass
-
-            session_path = cog_data_path(self) / "sessions.pickle"
-            if os.path.isfile(session_path):
-                with open(session_path, "rb") as f:
-                    try:
-                        self._sessions = pickle.load(f)
-                    except EOFError:
-                        self._sessions = {}
-            else:
+            if self._journal.exists():
+                sessions, raids = self._journal.replay()
+                for (channel_id, history) in raids.items():
+                    for raid in history:
+                        self._adv_results.add_raid(channel_id, raid)
                 self._sessions = {}
-
-            to_delete = []
-            for k, v in self._sessions.items():
-                try:
-                    await v.load_from_pickle(self.bot)
-                except discord.NotFound:
-                    to_delete.append(k)
+                for (channel_id, data) in sessions.items():
+                    session = GameSession.from_json(self.bot, data)
+                    if session is not None:
+                        self._sessions[channel_id] = session
+            else:
+                await self._load_legacy_pickles()
+            self._checkpoint()
+            for path in ("results.pickle", "sessions.pickle"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(cog_data_path(self) / path)
+
+            for session in self._sessions.values():
+                for user in list(session.reactors):
+                    if user is not None:
+                        self._join_session(session, user)
+
+            now = datetime.now()
+            semaphore = asyncio.Semaphore(5)
+            for (channel_id, session) in list(self._sessions.items()):
+                if session.start_time + timedelta(seconds=session.timer) <= now:
+                    # ran out while we were offline: its adventure and countdown messages stay in the
+                    # channel with their reactions, but are no longer tracked; dropped without API calls
+                    self._end_session(channel_id)
+                    await self.config.channel_from_id(channel_id).cooldown.set(0)
                     continue
-
-                async def refresh_timer():
-                    # emulate everything after message is sent incl countdowns
-                    if not isinstance(v.message, discord.Message):
-                        # something went wrong in parsing the pickle
-                        return
-
-                    ctx = await self.bot.get_context(v.message)
-                    timer = await self._adv_countdown(ctx, v.timer, "Time remaining")
-
-                    self.tasks[v.message_id] = timer
-                    try:
-                        await asyncio.wait_for(timer, timeout=v.timeout + 5)
-                    except Exception as exc:
-                        timer.cancel()
-                        log.exception("Error with the countdown timer", exc_info=exc)
-
-                    try:
-                        await self._result(ctx, v.message)
-                        if ctx.channel.id not in self._sessions:
-                            reward = None
-                            participants = None
-                        else:
-                            reward = self._rewards
-                            participants = self._sessions[ctx.channel.id].participants
-                    except Exception as exc:
-                        await self.config.channel(ctx.channel).cooldown.set(0)
-                        log.exception("Something went wrong controlling the game", exc_info=exc)
-                        while ctx.channel.id in self._sessions:
-                            del self._sessions[ctx.channel.id]
-                        return
-                    if not reward and not participants:
-                        await self.config.channel(ctx.channel).cooldown.set(0)
-                        while ctx.channel.id in self._sessions:
-                            del self._sessions[ctx.channel.id]
-                        return
-                    reward_copy = reward.copy()
-                    send_message = ""
-                    for (userid, rewards) in reward_copy.items():
-                        if rewards:
-                            user = ctx.guild.get_member(userid)  # bot.get_user breaks sometimes :ablobsweats:
-                            if user is None:
-                                # sorry no rewards if you leave the server
-                                continue
-                            msg = await self._add_rewards(ctx, user, rewards["xp"], rewards["cp"], rewards["special"])
-                            if msg:
-                                send_message += f"{msg}\n"
-                            self._rewards[userid] = {}
-                    if send_message:
-                        for page in pagify(send_message):
-                            await smart_embed(ctx, page, success=True)
-                    if participants:
-                        for user in participants:  # reset activated abilities
-                            async with self.get_lock(user):
-                                c = await self.get_character_from_json(user)
-                                if c.heroclass["name"] != "Ranger" and c.heroclass["ability"]:
-                                    c.heroclass["ability"] = False
-                                if c.last_currency_check + 600 < time.time() or c.bal > c.last_known_currency:
-                                    c.last_known_currency = await bank.get_balance(user)
-                                    c.last_currency_check = time.time()
-                                await self.config.user(user).set(await c.to_json(self.config))
-
-                    while ctx.channel.id in self._sessions:
-                        del self._sessions[ctx.channel.id]
-
-                task = self.bot.loop.create_task(refresh_timer())
-                self.tasks[v.countdown_message.id] = task
-
-            for k in to_delete:
-                del self._sessions[k]
+                self._restoring[channel_id] = asyncio.Event()
+                self._track_session_expiry(session)
+                self._track_task(session.message_id, self.bot.loop.create_task(self._resume_session(session, semaphore)))
         except Exception as err:
             log.exception("There was an error starting up the cog", exc_info=err)
         else:
             self._ready_event.set()
             self.gb_task = self.bot.loop.create_task(self._garbage_collection())
 
+    async def _load_legacy_pickles(self):
+        """Read the state written by versions that pickled sessions on unload."""
+        results_path = cog_data_path(self) / "results.pickle"
+        if os.path.isfile(results_path):
+            with open(results_path, "rb") as f:
+                try:
+                    self._adv_results = pickle.load(f)
+                except EOFError:
+                    pass
+
+        session_path = cog_data_path(self) / "sessions.pickle"
+        if os.path.isfile(session_path):
+            with open(session_path, "rb") as f:
+                try:
+                    self._sessions = pickle.load(f)
+                except EOFError:
+                    self._sessions = {}
+        else:
+            self._sessions = {}
+
+        to_delete = []
+        for k, v in self._sessions.items():
+            try:
+                await v.load_from_pickle(self.bot)
+            except AttributeError:
+                # the channel no longer exists
+                to_delete.append(k)
+        for k in to_delete:
+            del self._sessions[k]
+
+    def _checkpoint(self):
+        """Compact the session journal down to the sessions and results that are live right now."""
+        sessions = [s.to_json() for s in self._sessions.values() if s.countdown_message is not None]
+        self._journal.compact(sessions, self._adv_results.to_json())
+
+    async def _resume_session(self, session: GameSession, semaphore: asyncio.Semaphore):
+        # emulate everything after message is sent incl countdowns
+        channel_id = session.channel.id
+        try:
+            async with semaphore:
+                try:
+                    message = session.message
+                    if not isinstance(message, discord.Message):
+                        message = await session.channel.fetch_message(session.message_id)
+                except discord.HTTPException:
+                    self._end_session(channel_id)
+                    return
+                ctx = await self.bot.get_context(message)
+                remaining = session.timer - (datetime.now() - session.start_time).total_seconds()
+                timer = await self._adv_countdown(ctx, max(remaining, 0), "Time remaining")
+        finally:
+            restoring = self._restoring.pop(channel_id, None)
+            if restoring is not None:
+                restoring.set()
+        try:
+            await asyncio.wait_for(timer, timeout=max(remaining, 0) + 5)
+        except Exception as exc:
+            timer.cancel()
+            log.exception("Error with the countdown timer", exc_info=exc)
+
+        try:
+            await self._result(ctx, message)
+            if ctx.channel.id not in self._sessions:
+                reward = None
+                participants = None
+            else:
+                reward = self._rewards
+                participants = self._sessions[ctx.channel.id].participants
+        except Exception as exc:
+            await self.config.channel(ctx.channel).cooldown.set(0)
+            log.exception("Something went wrong controlling the game", exc_info=exc)
+            self._end_session(ctx.channel.id)
+            return
+        if not reward and not participants:
+            await self.config.channel(ctx.channel).cooldown.set(0)
+            self._end_session(ctx.channel.id)
+            return
+        send_message = await self._commit_rewards(ctx, participants, reward.copy())
+        if send_message:
+            for page in pagify(send_message):
+                await smart_embed(ctx, page, success=True)
+
+        self._end_session(ctx.channel.id)
+
     async def get_character_from_json(self, user, *, release_lock=False):
         try:
             return await Character.from_json(self.config, user, self._daily_bonus)
@@ -279,16 +347,15 @@ class MiscMixin(commands.Cog):
                 with contextlib.suppress(Exception):
                     lock.release()
 
-    async def cleanup_tasks(self):
-        await self._ready_event.wait()
-        while self is self.bot.get_cog("Adventure"):
-            to_delete = []
-            for (msg_id, task) in self.tasks.items():
-                if task.done():
-                    to_delete.append(msg_id)
-            for task in to_delete:
-                del self.tasks[task]
-            await asyncio.sleep(300)
+    def _track_task(self, key, task: asyncio.Task):
+        """Keep a reference to ``task`` until it finishes."""
+
+        def _forget(done: asyncio.Task):
+            if self.tasks.get(key) is done:
+                del self.tasks[key]
+
+        self.tasks[key] = task
+        task.add_done_callback(_forget)
 
     async def _migrate_config(self, from_version: int, to_version: int) -> None:
         log.debug(f"from_version: {from_version} to_version:{to_version}")
@@ -425,27 +492,41 @@ class MiscMixin(commands.Cog):
     def in_adventure(self, ctx=None, user=None, *, channel=False):
         """channel argument ensures that user is in the guild of trigger"""
         author = user or ctx.author
-        
+        channels = self._user_sessions.get(author.id)
+        if not channels:
+            return False
         if channel:
-            channel_id = getattr(channel, 'id', None)
-            try:
-                sessions = {channel_id: self._sessions[channel_id]}
-            except KeyError:
-                return False
-        else:
-            sessions = self._sessions
+            return getattr(channel, 'id', None) in channels
+        return True
 
-        if not sessions:
-            return False
+    def _join_session(self, session: GameSession, user):
+        session.reactors.add(user)
+        self._user_sessions.setdefault(user.id, set()).add(session.channel.id)
 
-        participants_ids = set(
-            [
-                p.id
-                for _channel_id, session in sessions.items()
-                for p in session.reactors
-            ]
-        )
-        return bool(author.id in participants_ids)
+    def _add_session_reaction(self, session: GameSession, user, action: str):
+        session.add_reaction(user, action)
+        self._journal.record("react", channel=session.channel.id, user=user.id, action=action)
+
+    def _remove_session_reaction(self, session: GameSession, user, action: str):
+        session.remove_reaction(user, action)
+        self._journal.record("unreact", channel=session.channel.id, user=user.id, action=action)
+
+    def _track_session_expiry(self, session: GameSession):
+        deadline = (session.start_time + _SESSION_TTL).timestamp()
+        heapq.heappush(self._session_expiry, (deadline, next(self._expiry_counter), session.channel.id, session))
+
+    def _end_session(self, channel_id: int):
+        session = self._sessions.pop(channel_id, None)
+        if session is None:
+            return
+        self._journal.record("end", channel=channel_id)
+        for user in session.reactors:
+            channels = self._user_sessions.get(getattr(user, "id", None))
+            if channels is None:
+                continue
+            channels.discard(channel_id)
+            if not channels:
+                del self._user_sessions[user.id]
 
     async def allow_in_dm(self, ctx):
         """Checks if the bank is global and allows the command in dm."""
@@ -454,9 +535,7 @@ class MiscMixin(commands.Cog):
         return bool(ctx.guild is None and await bank.is_global())
 
     def get_lock(self, member: discord.User):
-        if member.id not in self.locks:
-            self.locks[member.id] = asyncio.Lock()
-        return self.locks[member.id]
+        return self.locks.get(member.id)
 
     async def get_challenge(self, ctx: Context, monsters):
         c = await self.get_character_from_json(ctx.author)
@@ -589,9 +668,26 @@ class MiscMixin(commands.Cog):
             monster_stats = 1 + max((c.rebirths // 10) - 1, 0) / 2
         return monsters, monster_stats, transcended
 
+    @timed("simple")
     async def _simple(self, ctx: Context, adventure_msg, challenge: str = None, attribute: str = None):
         self.bot.dispatch("adventure", ctx)
         text = ""
+        session = await self._create_session(ctx, challenge, attribute)
+        if session.boss:
+            text = box(_("\n [{} Alarm!]").format(session.challenge), lang="css")
+        adventure_msg = (
+            f"{adventure_msg}{text}\n{random.choice(self.LOCATIONS)}\n"
+            f"**{self.escape(ctx.author.display_name)}**{random.choice(self.RAISINS)}"
+        )
+        await self._choice(ctx, adventure_msg)
+        if ctx.channel.id not in self._sessions:
+            return (None, None)
+        rewards = self._rewards
+        participants = self._sessions[ctx.channel.id].participants
+        return (rewards, participants)
+
+    async def _create_session(self, ctx: Context, challenge: str = None, attribute: str = None) -> GameSession:
+        """Pick a monster for this channel and register a new game session for it."""
         monster_roster, monster_stats, transcended = await self.update_monster_roster(ctx, ctx.author)
         if challenge and challenge not in monster_roster:
             for m in monster_roster:
@@ -620,7 +716,6 @@ class MiscMixin(commands.Cog):
             self.bot.dispatch("adventure_ascended", ctx)
         if monster_roster[challenge]["boss"]:
             timer = 60 * 5
-            text = box(_("\n [{} Alarm!]").format(new_challenge), lang="css")
             self.bot.dispatch("adventure_boss", ctx)  # dispatches an event on bosses
         elif monster_roster[challenge]["miniboss"]:
             timer = 60 * 3
@@ -645,17 +740,10 @@ class MiscMixin(commands.Cog):
             transcended=transcended,
             monster_modified_stats=self._dynamic_monster_stats(ctx, monster_roster[challenge]),
         )
-        adventure_msg = (
-            f"{adventure_msg}{text}\n{random.choice(self.LOCATIONS)}\n"
-            f"**{self.escape(ctx.author.display_name)}**{random.choice(self.RAISINS)}"
-        )
-        await self._choice(ctx, adventure_msg)
-        if ctx.channel.id not in self._sessions:
-            return (None, None)
-        rewards = self._rewards
-        participants = self._sessions[ctx.channel.id].participants
-        return (rewards, participants)
+        self._track_session_expiry(self._sessions[ctx.channel.id])
+        return self._sessions[ctx.channel.id]
 
+    @timed("choice")
     async def _choice(self, ctx: Context, adventure_msg):
         session = self._sessions[ctx.channel.id]
         dragon_text = _(
@@ -760,7 +848,7 @@ class MiscMixin(commands.Cog):
         start_adding_reactions(adventure_msg, self._adventure_actions)
 
         timer = await self._adv_countdown(ctx, session.timer, "Time remaining")
-        self.tasks[adventure_msg.id] = timer
+        self._journal.record("start", session=session.to_json())
         try:
             await asyncio.wait_for(timer, timeout=session.timeout + 5)
         except Exception as exc:
@@ -801,38 +889,40 @@ class MiscMixin(commands.Cog):
         return user.id not in await self.bot.db.blacklist()
 
     async def has_perm(self, user):
-        if hasattr(self.bot, "allowed_by_whitelist_blacklist"):
-            return await self.bot.allowed_by_whitelist_blacklist(user)
-        else:
-            return await self.local_perms(user) or await self.global_perms(user)
+        key = (getattr(getattr(user, "guild", None), "id", None), user.id)
+        allowed = self._perm_cache.get(key)
+        if allowed is None:
+            if hasattr(self.bot, "allowed_by_whitelist_blacklist"):
+                allowed = await self.bot.allowed_by_whitelist_blacklist(user)
+            else:
+                allowed = await self.local_perms(user) or await self.global_perms(user)
+            self._perm_cache[key] = allowed
+        return allowed
 
     async def _handle_adventure(self, reaction, user):
         channel = reaction.message.channel
         action = {str(v): k for k, v in self._adventure_controls.items()}[str(reaction.emoji)]
         session = self._sessions[channel.id]
         has_fund = await has_funds(user, 250)
-        for x in ["rage", "autoaim", "rant", "pray", "run"]:
-            if not has_fund or user in getattr(session, x, []):
+        if not has_fund:
+            for x in ["rage", "autoaim", "rant", "pray", "run"]:
                 with contextlib.suppress(discord.HTTPException):
                     symbol = self._adventure_controls[x]
                     await reaction.message.remove_reaction(symbol, user)
 
         restricted = await self.config.restrict()
-        if user not in getattr(session, action, []):
+        if user in session.reactors:
+            if has_fund:
+                self._add_session_reaction(session, user, action)
+                # take the earlier choice off the message so its reactions match what everyone picked
+                for previous in [i for i in session.reactions.get(user.id, []) if i != action]:
+                    self._remove_session_reaction(session, user, previous)
+                    with contextlib.suppress(discord.HTTPException):
+                        await reaction.message.remove_reaction(self._adventure_controls[previous], user)
+        elif user not in getattr(session, action, []):
             if has_fund:
                 if restricted:
-                    all_users = []
-                    for (channel_id, channel_session) in self._sessions.items():
-                        channel_users_in_game = (
-                            channel_session.rage
-                            | channel_session.autoaim
-                            | channel_session.rant
-                            | channel_session.pray
-                            | channel_session.run
-                        )
-                        all_users = all_users + channel_users_in_game
-
-                    if user in all_users:
+                    if self._user_sessions.get(user.id, set()) - {channel.id}:
                         user_id = f"{user.id}-{channel.id}"
                         # iterating through reactions here and removing them seems to be expensive
                         # so they can just keep their react on the adventures they can't join
@@ -846,9 +936,11 @@ class MiscMixin(commands.Cog):
                             self._react_messaged.append(user_id)
                             return
                     else:
-                        session.reactors.add(user)
+                        self._join_session(session, user)
+                        self._add_session_reaction(session, user, action)
                 else:
-                    session.reactors.add(user)
+                    self._join_session(session, user)
+                    self._add_session_reaction(session, user, action)
             else:
                 with contextlib.suppress(discord.HTTPException):
                     await user.send(
@@ -944,6 +1036,7 @@ class MiscMixin(commands.Cog):
             )
             self._current_traders[guild.id]["users"].remove(user)
 
+    @timed("result")
     async def _result(self, ctx: Context, message: discord.Message):
         if ctx.channel.id not in self._sessions:
             return
@@ -957,22 +1050,10 @@ class MiscMixin(commands.Cog):
         lost = False
         session = self._sessions[ctx.channel.id]
 
-        # update message object
-        message = await message.channel.fetch_message(message.id)
-
-        for r in message.reactions:
-            if str(r.emoji) in self._adventure_actions_emoji_names:
-                action = {str(v): k for k, v in self._adventure_controls.items()}[str(r.emoji)]
-                async for user in r.users():
-                    if not user.bot:
-                        # only allow user to do one action, so remove from all
-                        # others if found
-                        for x in ["rage", "autoaim", "rant", "pray", "run"]:
-                            if user in getattr(session, x, []):
-                                getattr(session, x).remove(user)
-
-                        getattr(session, action).add(user)
-                await asyncio.sleep(0.3)
+        # membership is tracked from reaction events; only re-read the message
+        # when we may have missed some of them
+        if session.needs_reconcile:
+            message = await self._reconcile_reactions(session, message)
 
         with contextlib.suppress(discord.HTTPException):
             await message.clear_reactions()
@@ -1022,9 +1103,14 @@ class MiscMixin(commands.Cog):
                 int_dipl=humanize_number(dipl),
             )
         if dmg_dealt >= diplomacy:
-            self._adv_results.add_result(ctx, "attack", dmg_dealt, people, slain, session.boss or session.transcended)
+            raid = self._adv_results.add_result(
+                ctx, "attack", dmg_dealt, people, slain, session.boss or session.transcended
+            )
         else:
-            self._adv_results.add_result(ctx, "talk", diplomacy, people, persuaded, session.boss or session.transcended)
+            raid = self._adv_results.add_result(
+                ctx, "talk", diplomacy, people, persuaded, session.boss or session.transcended
+            )
+        self._journal.record("result", channel=ctx.channel.id, raid=raid)
         result_msg = result_msg + "\n" + damage_str + diplo_str
 
         fight_name_list = []
@@ -1478,6 +1564,28 @@ class MiscMixin(commands.Cog):
                     parsed_users.append(user)
                 await self.config.user(user).set(await c.to_json(self.config))
 
+    async def _reconcile_reactions(self, session: GameSession, message: discord.Message) -> discord.Message:
+        """Rebuild the session's membership from the adventure message's reactions."""
+        message = await message.channel.fetch_message(message.id)
+        reacted = {}
+        for r in message.reactions:
+            if str(r.emoji) in self._adventure_actions_emoji_names:
+                action = {str(v): k for k, v in self._adventure_controls.items()}[str(r.emoji)]
+                async for user in r.users():
+                    if not user.bot:
+                        reacted.setdefault(user, []).append(action)
+
+        for user in session.reactors | set(reacted):
+            session.reactions[user.id] = []
+            self._join_session(session, user)
+            for action in reacted.get(user, []):
+                session.add_reaction(user, action)
+            if not reacted.get(user):
+                session.remove_reaction(user, "run")
+        session.needs_reconcile = False
+        return message
+
+    @timed("handle_run")
     async def handle_run(self, channel_id, attack, diplomacy, magic):
         runners = []
         msg = ""
@@ -1488,6 +1596,7 @@ class MiscMixin(commands.Cog):
             msg += _("{} just ran away.\n").format(humanize_list(runners))
         return (attack, diplomacy, magic, msg)
 
+    @timed("handle_fight")
     async def handle_fight(self, channel_id, fumblelist, critlist, attack, magic, challenge):
         session = self._sessions[channel_id]
         attack_list = session.rage | session.autoaim
@@ -1674,6 +1783,7 @@ class MiscMixin(commands.Cog):
                 session.autoaim.remove(user)
         return (fumblelist, critlist, attack, magic, msg)
 
+    @timed("handle_pray")
     async def handle_pray(self, channel_id, fumblelist, attack, diplomacy, magic):
         session = self._sessions[channel_id]
         god = await self.config.god_name()
@@ -1821,6 +1931,7 @@ class MiscMixin(commands.Cog):
                 session.pray.remove(user)
         return (fumblelist, attack, diplomacy, magic, msg)
 
+    @timed("handle_talk")
     async def handle_talk(self, channel_id, fumblelist, critlist, diplomacy):
         session = self._sessions[channel_id]
         if len(session.rant) >= 1:
@@ -1894,6 +2005,7 @@ class MiscMixin(commands.Cog):
                 session.rant.remove(user)
         return (fumblelist, critlist, diplomacy, msg)
 
+    @timed("handle_basilisk")
     async def handle_basilisk(self, ctx: Context, failed):
         session = self._sessions[ctx.channel.id]
         participants = session.rage | session.rant | session.pray | session.autoaim
@@ -1922,11 +2034,88 @@ class MiscMixin(commands.Cog):
             failed = False
         return failed
 
+    @timed("add_rewards")
     async def _add_rewards(self, ctx: Context, user, exp, cp, special):
         lock = self.get_lock(user)
         if not lock.locked():
             await lock.acquire()
         c = await self.get_character_from_json(user, release_lock=True)
+        rebirth_text = await self._apply_rewards(ctx, c, user, exp, cp, special)
+        await self.config.user(user).set(await c.to_json(self.config))
+        with contextlib.suppress(Exception):
+            lock.release()
+        return rebirth_text
+
+    @timed("commit_rewards")
+    async def _commit_rewards(self, ctx: Context, participants, rewards) -> str:
+        """Apply the end of adventure bookkeeping to every user at once.
+
+        Users are handled concurrently and each one is loaded and saved a single
+        time: participants get their ability cooldowns and currency check updated,
+        and anyone with an entry in ``rewards`` gets their xp, currency and chests.
+        Returns the level up messages.
+        """
+        session = self._sessions.get(ctx.channel.id)
+        users = {user.id: user for user in participants or []}
+        participant_ids = set(users)
+        payouts = {}
+        for (userid, reward) in rewards.items():
+            if not reward:
+                continue
+            user = ctx.guild.get_member(userid)  # bot.get_user breaks sometimes :ablobsweats:
+            if user is None:
+                # sorry no rewards if you leave the server
+                continue
+            users.setdefault(userid, user)
+            payouts[userid] = reward
+
+        results = await asyncio.gather(
+            *(
+                self._commit_user_rewards(ctx, session, user, payouts.get(userid), userid in participant_ids)
+                for (userid, user) in users.items()
+            ),
+            return_exceptions=True,
+        )
+        send_message = ""
+        for (userid, result) in zip(users, results):
+            if userid in payouts:
+                self._rewards[userid] = {}
+            if isinstance(result, Exception):
+                log.exception("Error while rewarding a user", exc_info=result)
+            elif result:
+                send_message += f"{result}\n"
+        return send_message
+
+    async def _commit_user_rewards(self, ctx: Context, session: GameSession, user, reward, participated) -> str:
+        async with self.get_lock(user):
+            c = await self.get_character_from_json(user)
+            if participated and session is not None:  # reset activated abilities
+                if c.heroclass["name"] != "Ranger" and c.heroclass["ability"]:
+                    cooldown_time = 0
+                    if c.heroclass["name"] == "Berserker" and user in session.rage:
+                        cooldown_time = max(240, (1140 - ((c.luck + c.total_att) * 2)))
+                    elif c.heroclass["name"] == "Tilter" and user in session.rant:
+                        cooldown_time = max(240, (1140 - ((c.luck + c.total_cha) * 2)))
+                    elif c.heroclass["name"] == "Autoaimer" and user in session.autoaim:
+                        cooldown_time = max(240, (1140 - ((c.luck + c.total_int) * 2)))
+                    elif c.heroclass["name"] == "Samaritan" and user in session.pray:
+                        cooldown_time = int(1.5 * max(240, (1140 - ((c.luck + c.total_int) * 2))))
+
+                    if cooldown_time:
+                        c.heroclass["ability"] = False
+
+                    c.heroclass["cooldown"] = time.time() + cooldown_time
+                if c.last_currency_check + 600 < time.time() or c.bal > c.last_known_currency:
+                    c.last_known_currency = c.bal
+                    c.last_currency_check = time.time()
+            text = ""
+            if reward:
+                text = await self._apply_rewards(ctx, c, user, reward["xp"], reward["cp"], reward["special"])
+            await self.config.user(user).set(await c.to_json(self.config))
+        return text
+
+    async def _apply_rewards(self, ctx: Context, c: Character, user, exp, cp, special) -> str:
+        """Pay out currency and add xp, levels and chests to an already loaded character."""
         rebirth_text = ""
         c.exp += exp
         member = ctx.guild.get_member(user.id)
@@ -1989,139 +2178,79 @@ class MiscMixin(commands.Cog):
                     special = False
         if special is not False:
             c.treasure = [sum(x) for x in zip(c.treasure, special)]
-        await self.config.user(user).set(await c.to_json(self.config))
-        with contextlib.suppress(Exception):
-            lock.release()
         return rebirth_text
 
-    async def _adv_countdown(self, ctx: Context, seconds, title) -> asyncio.Task:
+    async def _adv_countdown(self, ctx: Context, seconds, title) -> Countdown:
         await self._data_check(ctx)
+        secondint = int(seconds)
+        adv_end = await self._get_epoch(secondint)
+        timer, done, sremain = await self._remaining(adv_end)
+
+        message_adv = self._sessions[ctx.channel.id].countdown_message
+        if message_adv is None:
+            message_adv = await ctx.send(f"⏳ [{title}] {timer}s")
+            self._sessions[ctx.channel.id].countdown_message = message_adv
+
+        countdown = self._countdowns.schedule(
+            secondint,
+            message_adv,
+            lambda remaining: f"⏳ [{title}] {self._format_remaining(remaining)}s",
+            lambda sremain: (sremain % 5 == 0 and sremain <= 20) or sremain % 10 == 0,
+        )
+        self._adventure_countdown[ctx.channel.id] = countdown
+        return countdown
 
-        async def adv_countdown():
-            secondint = int(seconds)
-            adv_end = await self._get_epoch(secondint)
-            timer, done, sremain = await self._remaining(adv_end)
-
-            message_adv = self._sessions[ctx.channel.id].countdown_message
-            if message_adv is None:
-                message_adv = await ctx.send(f"⏳ [{title}] {timer}s")
-                self._sessions[ctx.channel.id].countdown_message = message_adv
-
-            deleted = False
-            while not done:
-                timer, done, sremain = await self._remaining(adv_end)
-                self._adventure_countdown[ctx.channel.id] = (timer, done, sremain)
-                if done:
-                    if not deleted:
-                        await message_adv.delete()
-                    break
-                elif not deleted and ((int(sremain) % 5 == 0 and int(sremain) <= 20) or int(sremain) % 10 == 0):
-                    try:
-                        await message_adv.edit(content=f"⏳ [{title}] {timer}s")
-                    except discord.NotFound:
-                        deleted = True
-                await asyncio.sleep(1)
-            log.debug("Timer countdown done.")
-
-        return self.bot.loop.create_task(adv_countdown())
-
-    async def _cart_countdown(self, ctx: Context, seconds, title, room=None) -> asyncio.Task:
+    async def _cart_countdown(self, ctx: Context, seconds, title, room=None) -> Countdown:
         room = room or ctx
         await self._data_check(ctx)
-
-        async def cart_countdown():
-            secondint = int(seconds)
-            cart_end = await self._get_epoch(secondint)
-            timer, done, sremain = await self._remaining(cart_end)
-            message_cart = await room.send(f"⏳ [{title}] {timer}s")
-            deleted = False
-            while not done:
-                timer, done, sremain = await self._remaining(cart_end)
-                self._trader_countdown[ctx.guild.id] = (timer, done, sremain)
-                if done:
-                    if not deleted:
-                        await message_cart.delete()
-                    break
-                if not deleted and int(sremain) % 5 == 0:
-                    try:
-                        await message_cart.edit(content=f"⏳ [{title}] {timer}s")
-                    except discord.NotFound:
-                        deleted = True
-                await asyncio.sleep(1)
-
-        return ctx.bot.loop.create_task(cart_countdown())
+        secondint = int(seconds)
+        cart_end = await self._get_epoch(secondint)
+        timer, done, sremain = await self._remaining(cart_end)
+        message_cart = await room.send(f"⏳ [{title}] {timer}s")
+        countdown = self._countdowns.schedule(
+            secondint,
+            message_cart,
+            lambda remaining: f"⏳ [{title}] {self._format_remaining(remaining)}s",
+            lambda sremain: sremain % 5 == 0,
+        )
+        self._trader_countdown[ctx.guild.id] = countdown
+        return countdown
 
     async def _genitem(self, rarity: str = None, slot: str = None):
         """Generate an item."""
-        if rarity == "set":
-            items = list(self.TR_GEAR_SET.items())
-            items = (
-                [
-                    i
-                    for i in items
-                    if i[1]["slot"] == [slot] or (slot == "two handed" and i[1]["slot"] == ["left", "right"])
-                ]
-                if slot
-                else items
-            )
-            item_name, item_data = random.choice(items)
-            return Item.from_json({item_name: item_data})
+        return (await self._genitems(rarity, 1, slot))[0]
 
-        RARE_INDEX = RARITIES.index("rare")
-        EPIC_INDEX = RARITIES.index("epic")
-        PREFIX_CHANCE = {"rare": 0.5, "epic": 0.75, "legendary": 0.9, "ascended": 1.0, "set": 0}
-        SUFFIX_CHANCE = {"epic": 0.5, "legendary": 0.75, "ascended": 0.5}
+    async def _genitems(self, rarity: str = None, count: int = 1, slot: str = None) -> List[Item]:
+        """Generate ``count`` items of one rarity.
+
+        Items that come out with the same name are merged, with ``owned``
+        holding how many of them were generated.
+        """
+        tables = self._item_tables
+        found = {}
+        if rarity == "set":
+            for (item_name, item_data) in random.choices(tables.set_pieces(slot), k=count):
+                if item_name in found:
+                    found[item_name].owned += 1
+                else:
+                    found[item_name] = Item.from_json({item_name: item_data})
+            return list(found.values())
 
         if rarity not in RARITIES:
             rarity = "normal"
-        if slot is None:
-            slot = random.choice(ORDER)
-        name = ""
-        stats = {"att": 0, "cha": 0, "int": 0, "dex": 0, "luck": 0}
-
-        def add_stats(word_stats):
-            """Add stats in word's dict to local stats dict."""
-            for stat in stats.keys():
-                if stat in word_stats:
-                    stats[stat] += word_stats[stat]
-
-        # only rare and above should have prefix with PREFIX_CHANCE
-        if RARITIES.index(rarity) >= RARE_INDEX and random.random() <= PREFIX_CHANCE[rarity]:
-            #  log.debug(f"Prefix %: {PREFIX_CHANCE[rarity]}")
-            prefix, prefix_stats = random.choice(list(self.PREFIXES.items()))
-            name += f"{prefix} "
-            add_stats(prefix_stats)
-
-        material, material_stat = random.choice(list(self.MATERIALS[rarity].items()))
-        name += f"{material} "
-        for stat in stats.keys():
-            stats[stat] += material_stat
-
-        equipment, equipment_stats = random.choice(list(self.EQUIPMENT[slot].items()))
-        name += f"{equipment}"
-        add_stats(equipment_stats)
-
-        # only epic and above should have suffix with SUFFIX_CHANCE
-        if RARITIES.index(rarity) >= EPIC_INDEX and random.random() <= SUFFIX_CHANCE[rarity]:
-            #  log.debug(f"Suffix %: {SUFFIX_CHANCE[rarity]}")
-            suffix, suffix_stats = random.choice(list(self.SUFFIXES.items()))
-            of_keyword = "of" if "the" not in suffix_stats else "of the"
-            name += f" {of_keyword} {suffix}"
-            add_stats(suffix_stats)
-
-        slot_list = [slot] if slot != "two handed" else ["left", "right"]
-        return Item(
-            name=name,
-            slot=slot_list,
-            rarity=rarity,
-            att=stats["att"],
-            int=stats["int"],
-            cha=stats["cha"],
-            dex=stats["dex"],
-            luck=stats["luck"],
-            owned=1,
-            parts=1,
-        )
+        for (name, item_slot, stats, copies) in tables.generate(rarity, count, slot):
+            if name in found:
+                found[name].owned += copies
+                continue
+            found[name] = Item(
+                name=name,
+                slot=slot_list(item_slot),
+                rarity=rarity,
+                **dict(zip(STATS, stats)),
+                owned=copies,
+                parts=1,
+            )
+        return list(found.values())
 
     async def _backpack_sell_button_action(self, ctx, emoji, page, item, price_shown, character):
         currency_name = await bank.get_currency_name(ctx.guild,)
@@ -2249,15 +2378,11 @@ class MiscMixin(commands.Cog):
             if user_data:
                 user_data = {k: user_data}
             raw_accounts_new.update(user_data)
-        sorted_acc = sorted(
-            raw_accounts_new.items(),
-            key=lambda x: (x[1].get("rebirths", 0), x[1].get("lvl", 1), x[1].get("set_items", 0)),
-            reverse=True,
-        )
-        if positions is None:
-            return sorted_acc
-        else:
-            return sorted_acc[:positions]
+        rows = [
+            ((v.get("rebirths", 0), v.get("lvl", 1), v.get("set_items", 0)), k) for (k, v) in raw_accounts_new.items()
+        ]
+        ranked = rank(rows, positions)
+        return [(k, raw_accounts_new[k]) for k in ranked]
 
     async def get_weekly_scoreboard(self, positions: int = None, guild: discord.Guild = None) -> List[tuple]:
         """Gets the bank's leaderboard.
@@ -2297,13 +2422,9 @@ class MiscMixin(commands.Cog):
                 user_data = {k: v["weekly_score"]}
                 raw_accounts_new.update(user_data)
 
-        sorted_acc = sorted(
-            raw_accounts_new.items(), key=lambda x: (x[1].get(keyword, 0), x[1].get("rebirths", 0)), reverse=True,
-        )
-        if positions is None:
-            return sorted_acc
-        else:
-            return sorted_acc[:positions]
+        rows = [((v.get(keyword, 0), v.get("rebirths", 0)), k) for (k, v) in raw_accounts_new.items()]
+        ranked = rank(rows, positions)
+        return [(k, raw_accounts_new[k]) for k in ranked]
 
     async def get_global_scoreboard(
         self, positions: int = None, guild: discord.Guild = None, keyword: str = None
@@ -2358,89 +2479,67 @@ class MiscMixin(commands.Cog):
                 user_data = {k: user_data}
             raw_accounts_new.update(user_data)
 
-        sorted_acc = sorted(
-            raw_accounts_new.items(), key=lambda x: (x[1].get(keyword, 0), x[1].get("rebirths", 0)), reverse=True,
-        )
-        if positions is None:
-            return sorted_acc
-        else:
-            return sorted_acc[:positions]
+        rows = [((v.get(keyword, 0), v.get("rebirths", 0)), k) for (k, v) in raw_accounts_new.items()]
+        ranked = rank(rows, positions)
+        return [(k, raw_accounts_new[k]) for k in ranked]
 
-    async def _roll_chest(self, chest_type: str, c: Character):
-        # set rarity to chest by default
-        rarity = chest_type
-        if chest_type == "pet":
-            rarity = "normal"
-        INITIAL_MAX_ROLL = 400
-        # max luck for best chest odds
-        MAX_CHEST_LUCK = 200
+    @staticmethod
+    def _chest_roll_range(c: Character) -> int:
         # lower gives you better chances for better items
-        max_roll = INITIAL_MAX_ROLL - round(c.luck) - (c.rebirths // 2)
-        top_range = max(max_roll, INITIAL_MAX_ROLL - MAX_CHEST_LUCK)
-        roll = max(random.randint(1, top_range), 1)
-        if chest_type == "normal":
-            if roll <= INITIAL_MAX_ROLL * 0.05:  # 5% to roll rare
-                rarity = "rare"
-            else:
-                pass  # 95% to roll common
-        elif chest_type == "rare":
-            if roll <= INITIAL_MAX_ROLL * 0.05:  # 5% to roll epic
-                rarity = "epic"
-            elif roll <= INITIAL_MAX_ROLL * 0.95:  # 90% to roll rare
-                pass
-            else:
-                rarity = "normal"  # 5% to roll normal
-        elif chest_type == "epic":
-            if roll <= INITIAL_MAX_ROLL * 0.05:  # 5% to roll legendary
-                rarity = "legendary"
-            elif roll <= INITIAL_MAX_ROLL * 0.90:  # 85% to roll epic
-                pass
-            else:  # 10% to roll rare
-                rarity = "rare"
-        elif chest_type == "legendary":
-            if roll <= INITIAL_MAX_ROLL * 0.75:  # 75% to roll legendary
-                pass
-            elif roll <= INITIAL_MAX_ROLL * 0.95:  # 20% to roll epic
-                rarity = "epic"
-            else:
-                rarity = "rare"  # 5% to roll rare
-        elif chest_type == "ascended":
-            if roll <= INITIAL_MAX_ROLL * 0.55:  # 55% to roll set
-                rarity = "ascended"
-            else:
-                rarity = "legendary"  # 45% to roll legendary
-        elif chest_type == "pet":
-            if roll <= INITIAL_MAX_ROLL * 0.05:  # 5% to roll legendary
-                rarity = "legendary"
-            elif roll <= INITIAL_MAX_ROLL * 0.15:  # 10% to roll epic
-                rarity = "epic"
-            elif roll <= INITIAL_MAX_ROLL * 0.57:  # 42% to roll rare
-                rarity = "rare"
-            else:
-                rarity = "normal"  # 47% to roll common
-        elif chest_type == "set":
-            if roll <= INITIAL_MAX_ROLL * 0.55:  # 55% to roll set
-                rarity = "set"
-            elif roll <= INITIAL_MAX_ROLL * 0.87:
-                rarity = "ascended"  # 45% to roll legendary
-            else:
-                rarity = "legendary"  # 45% to roll legendary
+        max_roll = _INITIAL_MAX_ROLL - round(c.luck) - (c.rebirths // 2)
+        return max(max_roll, _INITIAL_MAX_ROLL - _MAX_CHEST_LUCK)
+
+    @staticmethod
+    def _chest_rarity(chest_type: str, roll: int) -> str:
+        odds = _CHEST_ODDS.get(chest_type)
+        if odds is None:
+            return chest_type
+        for (bound, rarity) in odds:
+            if bound is None or roll <= _INITIAL_MAX_ROLL * bound:
+                return rarity
+
+    def _chest_rarity_weights(self, chest_type: str, c: Character) -> List[Tuple[str, int]]:
+        """Return how many of the possible rolls for ``c`` land on each rarity."""
+        top_range = self._chest_roll_range(c)
+        odds = _CHEST_ODDS.get(chest_type)
+        if odds is None:
+            return [(chest_type, top_range)]
+        weights = []
+        covered = 0
+        for (bound, rarity) in odds:
+            upper = top_range if bound is None else min(top_range, math.floor(_INITIAL_MAX_ROLL * bound))
+            weights.append((rarity, max(upper - covered, 0)))
+            covered = max(covered, upper)
+        return weights
 
-        return await self._genitem(rarity)
+    async def _roll_chest(self, chest_type: str, c: Character):
+        roll = random.randint(1, self._chest_roll_range(c))
+        return await self._genitem(self._chest_rarity(chest_type, roll))
 
     async def _open_chests(
         self, ctx: Context, user: discord.Member, chest_type: str, amount: int, character: Character,
     ):
+        """Open ``amount`` chests at once and add the loot to ``character``'s backpack.
+
+        The number of items per rarity is drawn in one go from the same odds
+        ``_roll_chest`` uses, so the loot follows the same distribution as
+        opening the chests one by one. The caller is responsible for saving.
+        """
+        weights = self._chest_rarity_weights(chest_type, character)
+        counts = multinomial(max(amount, 0), [w for (_, w) in weights])
         items = {}
-        async for i in AsyncIter(range(0, max(amount, 0))):
-            item = await self._roll_chest(chest_type, character)
-            item_name = str(item)
-            if item_name in items:
-                items[item_name].owned += 1
-            else:
-                items[item_name] = item
-            await character.add_to_backpack(item)
-        await self.config.user(ctx.author).set(await character.to_json(self.config))
+        for ((rarity, _), count) in zip(weights, counts):
+            if not count:
+                continue
+            for item in await self._genitems(rarity, count):
+                item_name = str(item)
+                if item_name in items:
+                    items[item_name].owned += item.owned
+                else:
+                    items[item_name] = item
+        for item in items.values():
+            # the backpack gets its own copy so later changes to it don't show up in the loot summary
+            await character.add_to_backpack(copy.copy(item), number=item.owned)
         return items
 
     async def _open_chest(self, ctx: Context, user, chest_type, character):
@@ -2688,6 +2787,10 @@ class MiscMixin(commands.Cog):
     async def _remaining(epoch):
         remaining = epoch - time.time()
         finish = remaining < 0
+        return (MiscMixin._format_remaining(remaining), finish, remaining)
+
+    @staticmethod
+    def _format_remaining(remaining: float) -> str:
         m, s = divmod(remaining, 60)
         h, m = divmod(m, 60)
         s = int(s)
@@ -2699,8 +2802,9 @@ class MiscMixin(commands.Cog):
             out = "{:02d}:{:02d}".format(m, s)
         else:
             out = "{:01d}:{:02d}:{:02d}".format(h, m, s)
-        return (out, finish, remaining)
+        return out
 
+    @timed("reward")
     async def _reward(self, ctx: Context, userlist, amount, modif, special):
         if modif == 0:
             modif = 0.5
@@ -2711,9 +2815,9 @@ class MiscMixin(commands.Cog):
         newcp = 0
         rewards_list = []
         phrase = ""
-        async for user in AsyncIter(userlist):
+        characters = await asyncio.gather(*(self.get_character_from_json(user) for user in userlist))
+        for (user, c) in zip(userlist, characters):
             self._rewards[user.id] = {}
-            c = await self.get_character_from_json(user)
             userxp = int(xp + (xp * 0.5 * c.rebirths) + (xp * 0.1 * min(250, c.total_int / 10)))
             # This got exponentially out of control before checking 1 skill
             # To the point where you can spec into only INT and
@@ -2799,29 +2903,43 @@ class MiscMixin(commands.Cog):
         return phrase
 
     @staticmethod
-    def _sell(c: Character, item: Item, *, amount: int = 1):
-        if item.rarity == "ascended":
-            base = (5000, 10000)
-        elif item.rarity == "legendary":
-            base = (1000, 2000)
-        elif item.rarity == "epic":
-            base = (500, 750)
-        elif item.rarity == "rare":
-            base = (250, 500)
-        else:
-            base = (10, 100)
-        price = random.randint(base[0], base[1]) * abs(item.max_main_stat)
-        price += price * int((c.total_cha) / 1000)
-
-        if c.luck > 0:
-            price = price + round(price * (c.luck / 1000))
-        if c.luck < 0:
-            price = price - round(price * (abs(c.luck) / 1000))
+    def _sell_modifiers(c: Character) -> Tuple[int, int, float]:
+        """The character's charisma multiplier, luck and rebirth bonus used by :meth:`_sell`."""
+        return int(c.total_cha / 1000), c.luck, min(0.1 * c.rebirths / 15, 0.4)
+
+    @staticmethod
+    def _sell_unit(roll: int, stat: int, modifiers: Tuple[int, int, float]) -> int:
+        cha, luck, rebirth_bonus = modifiers
+        price = roll * stat
+        price += price * cha
+
+        if luck > 0:
+            price = price + round(price * (luck / 1000))
+        if luck < 0:
+            price = price - round(price * (abs(luck) / 1000))
             if price < 0:
                 price = 0
-        price += round(price * min(0.1 * c.rebirths / 15, 0.4))
+        price += round(price * rebirth_bonus)
+        return price
+
+    @staticmethod
+    def _sell(c: Character, item: Item, *, amount: int = 1, modifiers: Tuple[int, int, float] = None):
+        """Price ``amount`` copies of ``item``, each with its own roll.
 
-        return max(price, base[0])
+        Every copy's price only depends on its roll, so past a handful of
+        copies the rolls are tallied per value and each distinct price is
+        computed once. Pass ``modifiers`` from :meth:`_sell_modifiers` when
+        pricing many items for the same character.
+        """
+        low, high = _SELL_BASE.get(item.rarity, (10, 100))
+        if modifiers is None:
+            modifiers = MiscMixin._sell_modifiers(c)
+        stat = abs(item.max_main_stat)
+        if amount <= high - low + 1:
+            rolls = ((random.randint(low, high), 1) for _ in range(amount))
+        else:
+            rolls = ((low + i, count) for (i, count) in enumerate(multinomial(amount, [1] * (high - low + 1))))
+        return sum(max(MiscMixin._sell_unit(roll, stat, modifiers), low) * count for (roll, count) in rolls if count)
 
     async def _trader(self, ctx: Context, bypass=False):
         em_list = ReactionPredicate.NUMBER_EMOJIS
@@ -2856,46 +2974,10 @@ class MiscMixin(commands.Cog):
         currency_name = await bank.get_currency_name(ctx.guild,)
         if str(currency_name).startswith("<"):
             currency_name = "credits"
-        for (index, item) in enumerate(stock):
-            item = stock[index]
-            if len(item["item"].slot) == 2:  # two handed weapons add their bonuses twice
-                hand = "two handed"
-                rage = item["item"].att * 2
-                rant = item["item"].cha * 2
-                acc = item["item"].int * 2
-                luck = item["item"].luck * 2
-                dex = item["item"].dex * 2
-            else:
-                if item["item"].slot[0] == "right" or item["item"].slot[0] == "left":
-                    hand = item["item"].slot[0] + _(" handed")
-                else:
-                    hand = item["item"].slot[0] + _(" slot")
-                rage = item["item"].att
-                rant = item["item"].cha
-                acc = item["item"].int
-                luck = item["item"].luck
-                dex = item["item"].dex
+        for (index, item) in stock.items():
             text += box(
-                _(
-                    "\n[{i}] Lvl req {lvl} | {item_name} ("
-                    "Rage: {str_rage}, "
-                    "Rant: {str_rant}, "
-                    "Accuracy: {str_acc}, "
-                    "Dexterity: {str_dex}, "
-                    "Luck: {str_luck} "
-                    "[{hand}]) for {item_price} {currency_name}."
-                ).format(
-                    i=str(index + 1),
-                    item_name=item["item"].formatted_name,
-                    lvl=item["item"].lvl,
-                    str_rage=str(rage),
-                    str_acc=str(acc),
-                    str_rant=str(rant),
-                    str_luck=str(luck),
-                    str_dex=str(dex),
-                    hand=hand,
-                    item_price=humanize_number(item["price"]),
-                    currency_name=currency_name,
+                _("\n[{i}] {line} {currency_name}.").format(
+                    i=str(index + 1), line=item["line"], currency_name=currency_name
                 ),
                 lang="css",
             )
@@ -2907,7 +2989,6 @@ class MiscMixin(commands.Cog):
         if timeout <= 0:
             timeout = 0
         timer = await self._cart_countdown(ctx, timeout, _("The cart will leave in: "), room=room)
-        self.tasks[msg.id] = timer
         try:
             await asyncio.wait_for(timer, timeout + 5)
         except asyncio.TimeoutError:
@@ -2917,39 +2998,68 @@ class MiscMixin(commands.Cog):
             await msg.delete()
 
     async def _trader_get_items(self, howmany: int):
-        items = {}
-        output = {}
-
+        """Stock a cart with ``howmany`` items, taken from the pregenerated pool when it has them."""
+        items = {entry["itemname"]: entry for entry in self._cart_stock.take(howmany)}
         while len(items) < howmany:
-            rarity_roll = random.random()
-            #  rarity_roll = .9
-            # 1% legendary
-            if rarity_roll >= 0.95:
-                item = await self._genitem("legendary")
-                # min. 10 stat for legendary, want to be about 50k
-                price = random.randint(2500, 5000)
-            # 20% epic
-            elif rarity_roll >= 0.7:
-                item = await self._genitem("epic")
-                # min. 5 stat for epic, want to be about 25k
-                price = random.randint(1000, 2000)
-            # 35% rare
-            elif rarity_roll >= 0.35:
-                item = await self._genitem("rare")
-                # around 3 stat for rare, want to be about 3k
-                price = random.randint(500, 1000)
-            else:
-                item = await self._genitem("normal")
-                # 1 stat for normal, want to be <1k
-                price = random.randint(100, 500)
-            # 35% normal
-            price *= item.max_main_stat
-
-            items.update({item.name: {"itemname": item.name, "item": item, "price": price, "lvl": item.lvl}})
+            for entry in await self._trader_roll(howmany - len(items)):
+                items.setdefault(entry["itemname"], entry)
+        return {index: entry for (index, entry) in enumerate(list(items.values())[:howmany])}
+
+    async def _trader_roll(self, howmany: int) -> List[dict]:
+        """Roll and price ``howmany`` cart items, rendering the line each one is listed with."""
+        # never draw more than asked for, so a cart ends up with exactly the stock it rolled
+        counts = multinomial(howmany, [weight for (_, weight, _) in _TRADER_ODDS])
+        drawn = []
+        for ((rarity, _, price_range), count) in zip(_TRADER_ODDS, counts):
+            if count:
+                drawn.extend((item, price_range) for item in await self._genitems(rarity, count))
+        # keep the rarities mixed in the cart like they were when items were rolled one by one
+        random.shuffle(drawn)
+        entries = []
+        for (item, price_range) in drawn:
+            price = random.randint(*price_range) * item.max_main_stat
+            item.owned = 1
+            entries.append(
+                {
+                    "itemname": item.name,
+                    "item": item,
+                    "price": price,
+                    "lvl": item.lvl,
+                    "line": self._trader_line(item, price),
+                }
+            )
+        return entries
 
-        for (index, item) in enumerate(items):
-            output.update({index: items[item]})
-        return output
+    @staticmethod
+    def _trader_line(item: Item, price: int) -> str:
+        if len(item.slot) == 2:  # two handed weapons add their bonuses twice
+            hand = "two handed"
+            multiplier = 2
+        else:
+            if item.slot[0] == "right" or item.slot[0] == "left":
+                hand = item.slot[0] + _(" handed")
+            else:
+                hand = item.slot[0] + _(" slot")
+            multiplier = 1
+        return _(
+            "Lvl req {lvl} | {item_name} ("
+            "Rage: {str_rage}, "
+            "Rant: {str_rant}, "
+            "Accuracy: {str_acc}, "
+            "Dexterity: {str_dex}, "
+            "Luck: {str_luck} "
+            "[{hand}]) for {item_price}"
+        ).format(
+            item_name=item.formatted_name,
+            lvl=item.lvl,
+            str_rage=str(item.att * multiplier),
+            str_acc=str(item.int * multiplier),
+            str_rant=str(item.cha * multiplier),
+            str_luck=str(item.luck * multiplier),
+            str_dex=str(item.dex * multiplier),
+            hand=hand,
+            item_price=humanize_number(price),
+        )
 
     @staticmethod
     def escape(t: str) -> str:
@@ -2988,13 +3098,23 @@ class MiscMixin(commands.Cog):
         final_words += [word if word in exceptions else word.capitalize() for word in lowercase_words[1:]]
         return " ".join(final_words)
 
+    async def cog_before_invoke(self, ctx: Context):
+        self._metrics.start_command(ctx.command.qualified_name)
+
+    async def cog_after_invoke(self, ctx: Context):
+        self._metrics.end_command()
+
     async def cog_check(self, ctx: Context):
         await self._ready_event.wait()
+        restoring = self._restoring.get(getattr(ctx.channel, "id", None))
+        if restoring is not None:
+            # this channel's adventure from before the restart is still being resumed
+            await restoring.wait()
 
         if self.maintenance and not await ctx.bot.is_owner(ctx.author):
             raise AdventureCheckFailure("The bot is currently under maintenance.")
 
-        if ctx.author.id in self.locks and self.locks[ctx.author.id].locked():
+        if self.locks.locked(ctx.author.id):
             raise AdventureCheckFailure(f"Another operation is currently executing for {ctx.author.mention}. Try again later.")
 
         if ctx.guild:
@@ -3080,22 +3200,18 @@ class MiscMixin(commands.Cog):
         emojis = list(ReactionPredicate.NUMBER_EMOJIS) + self._adventure_actions_emoji_names
         if str(reaction.emoji) not in emojis:
             return
-        if not await self.has_perm(user):
-            return
         if channel.id in self._sessions:
             if reaction.message.id == self._sessions[channel.id].message_id:
-                if channel.id in self._adventure_countdown:
-                    (timer, done, sremain) = self._adventure_countdown[channel.id]
-                    if sremain > 0:
-                        await self._handle_adventure(reaction, user)
+                countdown = self._adventure_countdown.get(channel.id)
+                if countdown and not countdown.done() and await self.has_perm(user):
+                    await self._handle_adventure(reaction, user)
         if guild.id in self._current_traders:
             if reaction.message.id == self._current_traders[guild.id]["msg"]:
                 if user in self._current_traders[guild.id]["users"]:
                     return
-                if guild.id in self._trader_countdown:
-                    (timer, done, sremain) = self._trader_countdown[guild.id]
-                    if sremain > 0:
-                        await self._handle_cart(reaction, user)
+                countdown = self._trader_countdown.get(guild.id)
+                if countdown and not countdown.done() and await self.has_perm(user):
+                    await self._handle_cart(reaction, user)
 
     @commands.Cog.listener()
     async def on_reaction_remove(self, reaction, user):
@@ -3110,16 +3226,26 @@ class MiscMixin(commands.Cog):
         emojis = list(ReactionPredicate.NUMBER_EMOJIS) + self._adventure_actions_emoji_names
         if str(reaction.emoji) not in emojis:
             return
-        if not await self.has_perm(user):
-            return
         if channel.id in self._sessions:
             if reaction.message.id == self._sessions[channel.id].message_id:
-                if channel.id in self._adventure_countdown:
-                    (timer, done, sremain) = self._adventure_countdown[channel.id]
-                    if sremain > 0:
-                        session = self._sessions[channel.id]
-                        if user in session.reactors:
-                            session.run.add(user)
+                countdown = self._adventure_countdown.get(channel.id)
+                if countdown and not countdown.done():
+                    session = self._sessions[channel.id]
+                    action = {str(v): k for k, v in self._adventure_controls.items()}.get(str(reaction.emoji))
+                    if action and user in session.reactors and await self.has_perm(user):
+                        self._remove_session_reaction(session, user, action)
+
+    @commands.Cog.listener("on_member_update")
+    async def _clear_perm_cache(self, before, after):
+        if before.roles != after.roles:
+            self._perm_cache.pop((after.guild.id, after.id))
+
+    @commands.Cog.listener()
+    async def on_resumed(self):
+        # Reaction events sent while the gateway was down may be lost, so let
+        # running adventures re-read their message once before resolving.
+        for session in self._sessions.values():
+            session.needs_reconcile = True
 
     @commands.Cog.listener()
     async def on_message_without_command(self, message):
@@ -3193,8 +3319,6 @@ class MiscMixin(commands.Cog):
             )
 
     def cog_unload(self):
-        if self.cleanup_loop:
-            self.cleanup_loop.cancel()
         if self._init_task:
             self._init_task.cancel()
         if self.gb_task:
@@ -3202,30 +3326,41 @@ class MiscMixin(commands.Cog):
         if self._timed_roles_task:
             self._timed_roles_task.cancel()
 
-        for (msg_id, task) in self.tasks.items():
+        self._countdowns.close()
+        self._cart_stock.close()
+        self._metrics.uninstall()
+        bank._config = self._metrics.untrack_config(bank._config)
+        for task in list(self.tasks.values()):
             task.cancel()
 
-        for lock in self.locks.values():
+        for lock in self.locks.held():
             with contextlib.suppress(Exception):
                 lock.release()
 
-        with open(cog_data_path(self) / "sessions.pickle", "wb+") as f:
-            pickle.dump(self._sessions, f)
-
-        with open(cog_data_path(self) / "results.pickle", "wb+") as f:
-            pickle.dump(self._adv_results, f)
+        self._checkpoint()
+        self._journal.close()
 
     async def _garbage_collection(self):
         await self.bot.wait_until_red_ready()
-        delta = timedelta(minutes=6)
         with contextlib.suppress(asyncio.CancelledError):
             while True:
-                async for channel_id, session in AsyncIter(self._sessions.copy(), steps=5):
-                    if session.start_time + delta > datetime.now():
-                        if channel_id in self._sessions:
-                            del self._sessions[channel_id]
+                self._expire_sessions(time.time())
+                self._adv_results.evict_idle()
+                if self._journal.needs_compaction:
+                    self._checkpoint()
                 await asyncio.sleep(5)
 
+    def _expire_sessions(self, now: float):
+        """End every session that has been running for longer than ``_SESSION_TTL``.
+
+        Entries for sessions that already ended, or were replaced by a newer
+        session in the same channel, are simply dropped.
+        """
+        while self._session_expiry and self._session_expiry[0][0] <= now:
+            _, _, channel_id, session = heapq.heappop(self._session_expiry)
+            if self._sessions.get(channel_id) is session:
+                self._end_session(channel_id)
+
     @commands.Cog.listener()
     async def on_command_error(self, ctx: Context, error: Exception):
         if isinstance(error, commands.CommandNotFound):
@@ -0,0 +1,16 @@
+import heapq
+from operator import itemgetter
+from typing import Hashable, List, Optional, Tuple
+
+_first = itemgetter(0)
+
+
+def rank(rows: List[Tuple[tuple, Hashable]], positions: Optional[int] = None) -> List[Hashable]:
+    """Return the keys of ``rows`` ordered by their sort tuple, highest first.
+
+    Ties keep their input order, same as ``sorted(..., reverse=True)``. With
+    ``positions`` only the top rows are selected instead of sorting them all.
+    """
+    if positions is None:
+        return [key for (_, key) in sorted(rows, key=_first, reverse=True)]
+    return [key for (_, key) in heapq.nlargest(positions, rows, key=_first)]
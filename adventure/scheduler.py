@@ -0,0 +1,165 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import math
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import discord
+
+from .metrics import detach
+
+log = logging.getLogger("red.cogs.adventure.scheduler")
+
+_DELETE = object()
+
+
+class Countdown:
+    """Handle for a single countdown driven by :class:`CountdownScheduler`.
+
+    It behaves like the task it replaces: it can be awaited (resolving when
+    the countdown runs out), cancelled, and checked with :meth:`done`.
+    """
+
+    def __init__(
+        self, end: float, message: discord.Message, render: Callable[[float], str], should_edit: Callable[[int], bool]
+    ):
+        self.end = end
+        self.message = message
+        self.deleted = False
+        self._render = render
+        self._should_edit = should_edit
+        self._future = asyncio.get_event_loop().create_future()
+
+    def __await__(self):
+        return self._future.__await__()
+
+    def remaining(self) -> float:
+        return self.end - time.time()
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def cancel(self) -> bool:
+        return self._future.cancel()
+
+    def _next_edit(self, now: float) -> float:
+        """Return the next point in time at which the countdown message should change."""
+        seconds = math.ceil(self.end - now) - 1
+        while seconds > 0:
+            if self._should_edit(seconds):
+                return self.end - seconds
+            seconds -= 1
+        return self.end
+
+
+class CountdownScheduler:
+    """Drive every countdown from a single task instead of one sleeping task per timer.
+
+    Pending deadlines are kept in a heap ordered by the next time a countdown
+    needs attention, either to refresh its message or to expire. Message
+    edits are queued per channel, which is the unit Discord rate limits
+    message edits on, and an edit that has not been sent yet is replaced by
+    newer content rather than queued behind it.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Countdown]] = []
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._driver: Optional[asyncio.Task] = None
+        self._pending: Dict[int, Dict[Countdown, object]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+
+    def schedule(
+        self,
+        seconds: float,
+        message: discord.Message,
+        render: Callable[[float], str],
+        should_edit: Callable[[int], bool],
+    ) -> Countdown:
+        """Start a countdown that refreshes ``message`` and deletes it on expiry.
+
+        ``render`` turns the remaining seconds into the message content and
+        ``should_edit`` decides at which whole seconds left the message is refreshed.
+        """
+        handle = Countdown(time.time() + max(seconds, 0), message, render, should_edit)
+        self._push(handle, handle._next_edit(time.time()))
+        if self._driver is None or self._driver.done():
+            self._wakeup = asyncio.Event()
+            self._driver = asyncio.get_event_loop().create_task(self._run())
+        return handle
+
+    def close(self):
+        """Cancel every countdown and the tasks driving them."""
+        for (_, _, handle) in self._heap:
+            handle.cancel()
+        self._heap.clear()
+        if self._driver is not None:
+            self._driver.cancel()
+        for task in self._workers.values():
+            task.cancel()
+        self._workers.clear()
+        self._pending.clear()
+
+    def _push(self, handle: Countdown, when: float):
+        first = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (when, next(self._counter), handle))
+        if self._wakeup is not None and (first is None or when < first):
+            self._wakeup.set()
+
+    async def _run(self):
+        detach()
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            when, _, handle = self._heap[0]
+            now = time.time()
+            if when > now:
+                self._wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=when - now)
+                continue
+            heapq.heappop(self._heap)
+            if handle.done():
+                continue
+            if now >= handle.end:
+                handle._future.set_result(None)
+                self._queue(handle, _DELETE)
+            else:
+                self._queue(handle, handle._render(round(handle.end - now)))
+                self._push(handle, handle._next_edit(now))
+
+    def _queue(self, handle: Countdown, content):
+        if handle.deleted:
+            return
+        bucket = handle.message.channel.id
+        self._pending.setdefault(bucket, {})[handle] = content
+        if bucket not in self._workers:
+            self._workers[bucket] = asyncio.get_event_loop().create_task(self._drain(bucket))
+
+    async def _drain(self, bucket: int):
+        pending = self._pending[bucket]
+        try:
+            while pending:
+                handle = next(iter(pending))
+                content = pending.pop(handle)
+                if handle.deleted:
+                    continue
+                try:
+                    if content is _DELETE:
+                        handle.deleted = True
+                        await handle.message.delete()
+                    else:
+                        await handle.message.edit(content=content)
+                except discord.NotFound:
+                    handle.deleted = True
+                except discord.HTTPException as exc:
+                    log.debug("Could not update countdown message", exc_info=exc)
+        finally:
+            self._pending.pop(bucket, None)
+            self._workers.pop(bucket, None)
@@ -1,9 +1,14 @@
 import asyncio
 import contextlib
 import logging
+import math
 import platform
+import random
 import time
-from typing import List, MutableMapping
+import weakref
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Any, Deque, Hashable, List, MutableMapping, Tuple
 
 import discord
 from discord.ext import commands
@@ -95,7 +100,14 @@ def can_use_ability():
             'emote': 'Tilter'
         }
 
-        async with ctx.cog.get_lock(ctx.author):
+        lock = ctx.cog.get_lock(ctx.author)
+        try:
+            await lock.acquire(timeout=10)
+        except asyncio.TimeoutError:
+            raise AdventureCheckFailure(
+                _("Another operation is currently executing for {}. Try again later.").format(ctx.author.mention)
+            )
+        try:
             c = await ctx.cog.get_character_from_json(ctx.author)
             if c.heroclass["name"] != heroclass[ctx.command.name]:
                 clz = heroclass[ctx.command.name]
@@ -125,7 +137,8 @@ def can_use_ability():
                         ),
                         retry_after=cooldown_time
                     )
-        
+        finally:
+            lock.release()
         return True
 
     return check(predicate)
@@ -180,11 +193,21 @@ class Member(commands.converter.MemberConverter):
 
 
 class AdventureResults:
-    """Object to store recent adventure results."""
+    """Object to store recent adventure results.
 
-    def __init__(self, num_raids):
+    Each channel keeps a fixed size buffer of its last raids together with the
+    stat range and boss flag derived from it. Both are refreshed when a raid is
+    added, so the per adventure queries are plain lookups. Channels without
+    any activity for ``idle_timeout`` seconds are dropped by :meth:`evict_idle`.
+    """
+
+    def __init__(self, num_raids, idle_timeout: float = 7 * 24 * 60 * 60):
         self._num_raids = num_raids
-        self._last_raids: MutableMapping[int, List] = {}
+        self._idle_timeout = idle_timeout
+        self._last_raids: MutableMapping[int, Deque[dict]] = {}
+        self._stat_ranges: MutableMapping[int, dict] = {}
+        self._recent_boss: MutableMapping[int, bool] = {}
+        self._last_seen: MutableMapping[int, float] = {}
 
     def add_result(self, ctx: Context, main_action, amount, num_ppl, success, boss):
         """Add result to this object.
@@ -195,16 +218,33 @@ class AdventureResults:
         :num_ppl: Number of people in adventure.
         :success: Whether adventure was successful or not.
         """
-        if ctx.channel.id not in self._last_raids:
-            self._last_raids[ctx.channel.id] = []
-
-        if len(self._last_raids.get(ctx.channel.id, [])) >= self._num_raids:
-            if ctx.channel.id in self._last_raids:
-                self._last_raids[ctx.channel.id].pop(0)
         raid_dict = {}
         for var in ("main_action", "amount", "num_ppl", "success", "boss"):
             raid_dict[var] = locals()[var]
-        self._last_raids[ctx.channel.id].append(raid_dict)
+        self.add_raid(ctx.channel.id, raid_dict)
+        return raid_dict
+
+    def add_raid(self, channel_id: int, raid_dict: dict):
+        """Append an already built result, e.g. one read back from the session journal."""
+        raids = self._last_raids.get(channel_id)
+        if raids is None:
+            raids = self._last_raids[channel_id] = deque(maxlen=self._num_raids)
+        raids.append(raid_dict)
+        self._stat_ranges[channel_id] = self._compute_stat_range(raids)
+        self._recent_boss[channel_id] = any(i["boss"] for i in islice(reversed(raids), 2))
+        self._last_seen[channel_id] = time.time()
+
+    def to_json(self) -> MutableMapping[int, List[dict]]:
+        return {k: list(v) for k, v in self._last_raids.items()}
+
+    def evict_idle(self):
+        """Forget channels that have not had an adventure for a long time."""
+        cutoff = time.time() - self._idle_timeout
+        for channel_id in [k for k, v in self._last_seen.items() if v < cutoff]:
+            del self._last_seen[channel_id]
+            self._last_raids.pop(channel_id, None)
+            self._stat_ranges.pop(channel_id, None)
+            self._recent_boss.pop(channel_id, None)
 
     def get_stat_range(self, ctx: Context):
         """Return reasonable stat range for monster pool to have based
@@ -212,14 +252,18 @@ class AdventureResults:
 
         :returns: Dict with stat_type, min_stat and max_stat.
         """
+        stats = self._stat_ranges.get(ctx.channel.id)
+        if stats is None:
+            return {"stat_type": "hp", "min_stat": 0, "max_stat": 0}
+        self._last_seen[ctx.channel.id] = time.time()
+        return stats
+
+    @staticmethod
+    def _compute_stat_range(raids: Deque[dict]) -> dict:
         # how much % to increase damage for solo raiders so that they
         # can't just solo every monster based on their own average
         # damage
-        if ctx.channel.id not in self._last_raids:
-            self._last_raids[ctx.channel.id] = []
         SOLO_RAID_SCALE = 0.25
-        if len(self._last_raids.get(ctx.channel.id, [])) == 0:
-            return {"stat_type": "hp", "min_stat": 0, "max_stat": 0}
 
         # tally up stats for raids
         num_attack = 0
@@ -229,50 +273,45 @@ class AdventureResults:
         num_wins = 0
         stat_type = "hp"
         avg_amount = 0
-        raids = self._last_raids.get(ctx.channel.id, [])
         raid_count = len(raids)
-        if raid_count == 0:
-            num_wins = self._num_raids // 2
-            raid_count = self._num_raids
-            win_percent = 0.5
-        else:
-            avg_count = 3
-            winrate_count = 6
-
-            for n, raid in enumerate(reversed(raids)):
-                if n < avg_count:
-                    if not raid.get("amount"):
-                        # Incrementing `avg_count` makes sure we still consider 3 raids (if possible).
-                        avg_count += 1
-                        # Similarly, incrementing `winrate_count` makes sure we consider 6 raids (if possible).
-                        winrate_count += 1
-                        continue
-                    if raid["main_action"] == "attack":
-                        num_attack += 1
-                        dmg_amount += raid["amount"]
-                        if raid["num_ppl"] == 1:
-                            dmg_amount += raid["amount"] * SOLO_RAID_SCALE
-                    else:
-                        num_talk += 1
-                        talk_amount += raid["amount"]
-                        if raid["num_ppl"] == 1:
-                            talk_amount += raid["amount"] * SOLO_RAID_SCALE
-                    log.debug(f"raid dmg: {raid['amount']}")
-                if raid["success"] and n < winrate_count:
-                    num_wins += 1
-            if num_attack > 0:
-                avg_amount = dmg_amount / num_attack
-            if dmg_amount < talk_amount:
-                stat_type = "dipl"
-                avg_amount = talk_amount / num_talk
-            win_percent = num_wins / min(winrate_count, raid_count)
-            min_stat = avg_amount * 0.75
-            max_stat = avg_amount * 2
-            # want win % to be at least 50%, even when solo
-            # if win % is below 50%, scale back min/max for easier mons
-            if win_percent < 0.5:
-                min_stat = avg_amount * win_percent
-                max_stat = avg_amount * 1.5
+        avg_count = 3
+        winrate_count = 6
+
+        for n, raid in enumerate(reversed(raids)):
+            if n >= max(avg_count, winrate_count):
+                break
+            if n < avg_count:
+                if not raid.get("amount"):
+                    # Incrementing `avg_count` makes sure we still consider 3 raids (if possible).
+                    avg_count += 1
+                    # Similarly, incrementing `winrate_count` makes sure we consider 6 raids (if possible).
+                    winrate_count += 1
+                    continue
+                if raid["main_action"] == "attack":
+                    num_attack += 1
+                    dmg_amount += raid["amount"]
+                    if raid["num_ppl"] == 1:
+                        dmg_amount += raid["amount"] * SOLO_RAID_SCALE
+                else:
+                    num_talk += 1
+                    talk_amount += raid["amount"]
+                    if raid["num_ppl"] == 1:
+                        talk_amount += raid["amount"] * SOLO_RAID_SCALE
+            if raid["success"] and n < winrate_count:
+                num_wins += 1
+        if num_attack > 0:
+            avg_amount = dmg_amount / num_attack
+        if dmg_amount < talk_amount:
+            stat_type = "dipl"
+            avg_amount = talk_amount / num_talk
+        win_percent = num_wins / min(winrate_count, raid_count)
+        min_stat = avg_amount * 0.75
+        max_stat = avg_amount * 2
+        # want win % to be at least 50%, even when solo
+        # if win % is below 50%, scale back min/max for easier mons
+        if win_percent < 0.5:
+            min_stat = avg_amount * win_percent
+            max_stat = avg_amount * 1.5
 
         stats_dict = {}
         for var in ("stat_type", "min_stat", "max_stat", "win_percent"):
@@ -281,23 +320,22 @@ class AdventureResults:
 
     def can_spawn_boss(self, ctx):
         """Ensures that the last 2 monsters are not bosses"""
-        raids = self._last_raids.get(ctx.channel.id, [])[-2:]
-        if any(i["boss"] for i in raids):
-            return False
-        return True
+        return not self._recent_boss.get(ctx.channel.id, False)
 
     def __str__(self):
-        return str(self._last_raids)
+        return str(self.to_json())
 
     def __getstate__(self):
-        state = self._last_raids.copy()
+        state = self.to_json()
         state["num_raids"] = self._num_raids
         return state
 
     def __setstate__(self, state):
-        self._num_raids = state["num_raids"]
-        del state["num_raids"]
-        self._last_raids: MutableMapping[int, List] = state
+        state = dict(state)
+        self.__init__(state.pop("num_raids"))
+        for (channel_id, raids) in state.items():
+            for raid in raids:
+                self.add_raid(channel_id, raid)
 
 
 class AdventureCheckFailure(commands.CheckFailure):
@@ -361,6 +399,120 @@ class FilterStr:
         return (self.sign == '+' and val in x) or (self.sign == '-' and val not in x)
 
 
+class TTLCache:
+    """Small mapping whose entries expire ``ttl`` seconds after they were stored."""
+
+    def __init__(self, ttl: float, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            return default
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        return value
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+
+class _RegisteredLock(asyncio.Lock):
+    """A lock that keeps itself in its :class:`LockRegistry` for as long as it is held."""
+
+    def __init__(self, registry: "LockRegistry", key: Hashable):
+        super().__init__()
+        self._registry = registry
+        self._key = key
+
+    async def acquire(self, timeout: float = None):
+        """Acquire the lock, raising :class:`asyncio.TimeoutError` after ``timeout`` seconds."""
+        start = time.monotonic()
+        contended = self.locked()
+        try:
+            if timeout is None:
+                await super().acquire()
+            else:
+                await asyncio.wait_for(super().acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._registry.timeouts += 1
+            raise
+        self._registry._held[self._key] = self
+        self._registry._record_wait(time.monotonic() - start, contended)
+        return True
+
+    def release(self):
+        super().release()
+        if self._registry._held.get(self._key) is self:
+            del self._registry._held[self._key]
+
+
+class LockRegistry:
+    """Per-key :class:`asyncio.Lock` objects that only live as long as they are needed.
+
+    Locks are kept through weak references, so a lock nobody holds and nobody
+    references any more is dropped instead of staying around for every user
+    that ever ran a command. Held locks are pinned, since they are often
+    released from a different function than the one that acquired them.
+    """
+
+    def __init__(self):
+        self._locks: "weakref.WeakValueDictionary[Hashable, _RegisteredLock]" = weakref.WeakValueDictionary()
+        self._held: MutableMapping[Hashable, _RegisteredLock] = {}
+        self.acquired = 0
+        self.contended = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def get(self, key: Hashable) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = _RegisteredLock(self, key)
+        return lock
+
+    def locked(self, key: Hashable) -> bool:
+        return key in self._held
+
+    def held(self) -> List[asyncio.Lock]:
+        return list(self._held.values())
+
+    def __len__(self):
+        return len(self._locks)
+
+    def _record_wait(self, waited: float, contended: bool):
+        self.acquired += 1
+        if contended:
+            self.contended += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def stats(self) -> dict:
+        return {
+            "locks": len(self._locks),
+            "held": len(self._held),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "timeouts": self.timeouts,
+            "mean_wait_ms": round(self.total_wait / self.acquired * 1000, 3) if self.acquired else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
 class UserCtx:
     def __init__(self, ctx: Context, user: discord.User):
         self.user = user
@@ -441,6 +593,74 @@ MENU_CONTROLS = {
 }
 
 
+def _binomialvariate(n: int, p: float) -> int:
+    """Binomial sample for interpreters without ``random.binomialvariate`` (added in Python 3.12).
+
+    Uses Devroye's geometric method when ``n * p`` is small and Hörmann's BTRS
+    transformed rejection otherwise, so the cost does not grow with ``n``.
+    """
+    if p <= 0:
+        return 0
+    if p >= 1:
+        return n
+    if p > 0.5:
+        return n - _binomialvariate(n, 1.0 - p)
+    if n * p < 10:
+        # count successes by jumping over the failures between them
+        successes = trials = 0
+        log_q = math.log(1.0 - p)
+        while True:
+            trials += math.floor(math.log(1.0 - random.random()) / log_q) + 1
+            if trials > n:
+                return successes
+            successes += 1
+    spq = math.sqrt(n * p * (1.0 - p))
+    b = 1.15 + 2.53 * spq
+    a = -0.0873 + 0.0248 * b + 0.01 * p
+    c = n * p + 0.5
+    v_r = 0.92 - 4.2 / b
+    alpha = (2.83 + 5.1 / b) * spq
+    lpq = math.log(p / (1.0 - p))
+    mode = math.floor((n + 1) * p)
+    h = math.lgamma(mode + 1) + math.lgamma(n - mode + 1)
+    while True:
+        u = random.random() - 0.5
+        v = random.random()
+        us = 0.5 - abs(u)
+        k = math.floor((2.0 * a / us + b) * u + c)
+        if k < 0 or k > n:
+            continue
+        if us >= 0.07 and v <= v_r:
+            return k
+        v = math.log(v * alpha / (a / (us * us) + b))
+        if v <= h - math.lgamma(k + 1) - math.lgamma(n - k + 1) + (k - mode) * lpq:
+            return k
+
+
+def multinomial(n: int, weights: List[float]) -> List[int]:
+    """Split ``n`` independent draws across categories with probability proportional to ``weights``.
+
+    Returns how many of the draws landed on each category, in one binomial
+    draw per category rather than one draw per item.
+    """
+    total = sum(weights)
+    counts = [0] * len(weights)
+    if n <= 0 or total <= 0:
+        return counts
+    binomial = getattr(random, "binomialvariate", _binomialvariate)
+    remaining = n
+    for (i, weight) in enumerate(weights):
+        if remaining <= 0:
+            break
+        if weight >= total:
+            counts[i] = remaining
+            break
+        counts[i] = binomial(remaining, weight / total) if weight > 0 else 0
+        remaining -= counts[i]
+        total -= weight
+    return counts
+
+
 def order_slots_dict(d: dict) -> dict:
     return {k: d[k] for k in sorted(d.keys(), key=lambda item: SLOT_ORDER[item])}
 
@@ -0,0 +1,5 @@
+"""Headless tooling used to exercise the Adventure cog without a Discord gateway.
+
+Nothing in here is loaded by Red; run the modules directly from the repository root, e.g.
+``python -m benchmarks.simulate --help``.
+"""
@@ -0,0 +1,358 @@
+"""Minimal stand-ins for the Discord and Red objects the Adventure cog touches.
+
+These only implement what the combat, reward and inventory code paths call. They are
+deliberately dumb: messages are kept in memory, nothing is rate limited, and Config data
+is round-tripped through JSON exactly like Red's JSON driver does.
+"""
+import asyncio
+import itertools
+import json
+from typing import Any, Dict, List, Optional
+
+_ids = itertools.count(10 ** 17)
+_MISSING = object()
+
+
+def next_id() -> int:
+    return next(_ids)
+
+
+def _copy(value):
+    return json.loads(json.dumps(value))
+
+
+class _Access:
+    """What ``await value()`` / ``async with group.all() as data`` resolve to."""
+
+    def __init__(self, node: "_Value"):
+        self._node = node
+        self._value = None
+
+    def __await__(self):
+        return self._node._get().__await__()
+
+    async def __aenter__(self):
+        self._value = await self._node._get()
+        return self._value
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self._node.set(self._value)
+
+
+class _Value:
+    def __init__(self, config: "MemoryConfig", scope: str, pk: Any, path: tuple):
+        self._config = config
+        self._scope = scope
+        self._pk = pk
+        self._path = path
+
+    def _default(self):
+        node = self._config._defaults[self._scope]
+        for part in self._path:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _raw(self):
+        node = self._config._data[self._scope].get(self._pk, _MISSING)
+        for part in self._path:
+            if not isinstance(node, dict) or part not in node:
+                return _MISSING
+            node = node[part]
+        return node
+
+    async def _get(self):
+        raw = self._raw()
+        return _copy(self._default() if raw is _MISSING else raw)
+
+    def __call__(self, default=_MISSING):
+        return _Access(self)
+
+    async def set(self, value):
+        data = self._config._data[self._scope]
+        if not self._path:
+            data[self._pk] = _copy(value)
+            return
+        node = data.setdefault(self._pk, {})
+        for part in self._path[:-1]:
+            node = node.setdefault(part, {})
+        node[self._path[-1]] = _copy(value)
+
+    async def clear(self):
+        data = self._config._data[self._scope]
+        if not self._path:
+            data.pop(self._pk, None)
+            return
+        node = data.get(self._pk, {})
+        for part in self._path[:-1]:
+            node = node.get(part, {})
+        node.pop(self._path[-1], None)
+
+
+class _Group(_Value):
+    def __getattr__(self, item: str):
+        if item.startswith("_"):
+            raise AttributeError(item)
+        default = self._default()
+        child_default = default.get(item) if isinstance(default, dict) else None
+        cls = _Group if isinstance(child_default, dict) else _Value
+        return cls(self._config, self._scope, self._pk, self._path + (item,))
+
+    async def _get(self):
+        raw = self._raw()
+        default = _copy(self._default() or {})
+        if raw is _MISSING:
+            return default
+        merged = _copy(raw)
+        for key, value in default.items():
+            merged.setdefault(key, value)
+        return merged
+
+    def all(self):
+        return _Access(self)
+
+
+class MemoryConfig:
+    """An in-memory replacement for :class:`redbot.core.Config`."""
+
+    GLOBAL = "GLOBAL"
+    GUILD = "GUILD"
+    CHANNEL = "TEXTCHANNEL"
+    USER = "USER"
+    MEMBER = "MEMBER"
+
+    def __init__(self):
+        scopes = (self.GLOBAL, self.GUILD, self.CHANNEL, self.USER, self.MEMBER)
+        self._defaults: Dict[str, dict] = {s: {} for s in scopes}
+        self._data: Dict[str, dict] = {s: {} for s in scopes}
+
+    @classmethod
+    def get_conf(cls, cog_instance, identifier: int, force_registration: bool = False, cog_name: str = None):
+        return cls()
+
+    def register_global(self, **kwargs):
+        self._defaults[self.GLOBAL].update(_copy(kwargs))
+
+    def register_guild(self, **kwargs):
+        self._defaults[self.GUILD].update(_copy(kwargs))
+
+    def register_channel(self, **kwargs):
+        self._defaults[self.CHANNEL].update(_copy(kwargs))
+
+    def register_user(self, **kwargs):
+        self._defaults[self.USER].update(_copy(kwargs))
+
+    def register_member(self, **kwargs):
+        self._defaults[self.MEMBER].update(_copy(kwargs))
+
+    def _get_base_group(self, scope: str, *primary_keys) -> _Group:
+        return _Group(self, scope, primary_keys[0] if primary_keys else 0, ())
+
+    def user(self, user) -> _Group:
+        return _Group(self, self.USER, user.id, ())
+
+    def user_from_id(self, user_id: int) -> _Group:
+        return _Group(self, self.USER, user_id, ())
+
+    def guild(self, guild) -> _Group:
+        return _Group(self, self.GUILD, guild.id, ())
+
+    def channel(self, channel) -> _Group:
+        return _Group(self, self.CHANNEL, channel.id, ())
+
+    def __getattr__(self, item: str):
+        if item.startswith("_"):
+            raise AttributeError(item)
+        return getattr(_Group(self, self.GLOBAL, 0, ()), item)
+
+    async def _all_from_scope(self, scope: str) -> Dict[int, dict]:
+        return {pk: await _Group(self, scope, pk, ()).all() for pk in self._data[scope]}
+
+    async def all_users(self) -> Dict[int, dict]:
+        return await self._all_from_scope(self.USER)
+
+    async def all_guilds(self) -> Dict[int, dict]:
+        return await self._all_from_scope(self.GUILD)
+
+    async def clear_all_users(self):
+        self._data[self.USER].clear()
+
+
+class _Permissions:
+    embed_links = True
+    add_reactions = True
+    manage_messages = True
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int = None, name: str = "Simulated Guild"):
+        self.id = guild_id or next_id()
+        self.name = name
+        self.members: Dict[int, "FakeMember"] = {}
+        self.channels: Dict[int, "FakeChannel"] = {}
+        self.owner = None
+
+    def get_member(self, user_id: int) -> Optional["FakeMember"]:
+        return self.members.get(user_id)
+
+    def get_channel(self, channel_id: int) -> Optional["FakeChannel"]:
+        return self.channels.get(channel_id)
+
+
+class FakeMember:
+    bot = False
+
+    def __init__(self, guild: FakeGuild, name: str, member_id: int = None):
+        self.id = member_id or next_id()
+        self.guild = guild
+        self.name = name
+        self.nick = None
+        self.display_name = name
+        self.mention = f"<@{self.id}>"
+        self.roles: List[Any] = []
+        guild.members[self.id] = self
+
+    def __eq__(self, other):
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self):
+        return self.id >> 22
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, *args, **kwargs):
+        return None
+
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", author, content: str = None, embed=None):
+        self.id = next_id()
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content or ""
+        self.embeds = [embed] if embed is not None else []
+        self.reactions: List[Any] = []
+        self.jump_url = f"https://discord.com/channels/{self.guild.id}/{channel.id}/{self.id}"
+
+    async def edit(self, content=None, embed=None, **kwargs):
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embeds = [embed]
+        self.channel.api_calls += 1
+
+    async def delete(self, *args, **kwargs):
+        self.channel.messages.pop(self.id, None)
+        self.channel.api_calls += 1
+
+    async def add_reaction(self, emoji):
+        self.channel.api_calls += 1
+
+    async def remove_reaction(self, emoji, member):
+        self.channel.api_calls += 1
+
+    async def clear_reactions(self):
+        self.reactions = []
+        self.channel.api_calls += 1
+
+
+class FakeChannel:
+    def __init__(self, guild: FakeGuild, bot_user, name: str = "adventure", channel_id: int = None):
+        self.id = channel_id or next_id()
+        self.guild = guild
+        self.name = name
+        self.mention = f"<#{self.id}>"
+        self.bot_user = bot_user
+        self.messages: Dict[int, FakeMessage] = {}
+        self.api_calls = 0
+        self.keep_history = False
+        guild.channels[self.id] = self
+
+    def permissions_for(self, member):
+        return _Permissions()
+
+    async def send(self, content=None, *, embed=None, **kwargs) -> FakeMessage:
+        message = FakeMessage(self, self.bot_user, content=content, embed=embed)
+        if self.keep_history:
+            self.messages[message.id] = message
+        self.api_calls += 1
+        return message
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        self.api_calls += 1
+        return self.messages[message_id]
+
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return self.messages[message_id]
+
+
+class FakeContext:
+    def __init__(self, bot: "FakeBot", channel: FakeChannel, author: FakeMember, message: FakeMessage = None):
+        self.bot = bot
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.me = bot.user
+        self.message = message or FakeMessage(channel, author)
+        self.prefix = "[p]"
+        self.clean_prefix = "[p]"
+        self.command = None
+        self.invoked_subcommand = None
+
+    async def send(self, content=None, **kwargs) -> FakeMessage:
+        kwargs.pop("reference", None)
+        kwargs.pop("delete_after", None)
+        return await self.channel.send(content, **kwargs)
+
+    async def embed_requested(self) -> bool:
+        return False
+
+    async def tick(self) -> bool:
+        return True
+
+
+class FakeBot:
+    def __init__(self):
+        self.user = FakeMember(FakeGuild(), "Adventure Bot")
+        self.user.bot = True
+        self.guilds: List[FakeGuild] = []
+        self._cogs: Dict[str, Any] = {}
+        self.dispatched = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return asyncio.get_event_loop()
+
+    def add_cog(self, cog):
+        self._cogs[cog.__class__.__name__] = cog
+
+    def get_cog(self, name: str):
+        return self._cogs.get(name)
+
+    def get_channel(self, channel_id: int):
+        for guild in self.guilds:
+            if channel_id in guild.channels:
+                return guild.channels[channel_id]
+        return None
+
+    def dispatch(self, event: str, *args, **kwargs):
+        self.dispatched += 1
+
+    async def wait_until_ready(self):
+        return None
+
+    async def wait_until_red_ready(self):
+        return None
+
+    async def is_owner(self, user) -> bool:
+        return False
+
+    async def allowed_by_whitelist_blacklist(self, user) -> bool:
+        return True
+
+    async def get_context(self, message: FakeMessage) -> FakeContext:
+        return FakeContext(self, message.channel, message.author, message)
@@ -0,0 +1,363 @@
+"""Monte Carlo adventure simulator.
+
+Runs the real combat and reward code of the Adventure cog against fake members and an
+in-memory Config, so balance changes (monster stats, loot tables, class abilities) and
+performance regressions can be measured without a Discord connection.
+
+Example::
+
+    python -m benchmarks.simulate --adventures 5000 --workers 4 --party 1 6 --output report.json
+
+The cog itself is imported unmodified; the harness only swaps ``Config`` for
+:class:`benchmarks.fakes.MemoryConfig` and points ``cog_data_path`` at a temporary
+directory before the cog is constructed. Red-DiscordBot must be importable.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import multiprocessing
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+from .fakes import FakeBot, FakeChannel, FakeContext, FakeGuild, FakeMember, FakeMessage, MemoryConfig
+
+# Cog methods that make up an adventure, in the order they run.
+PHASES = (
+    "_create_session",
+    "update_monster_roster",
+    "get_challenge",
+    "_dynamic_monster_stats",
+    "_result",
+    "handle_run",
+    "handle_basilisk",
+    "handle_pray",
+    "handle_talk",
+    "handle_fight",
+    "_reward",
+    "_commit_rewards",
+    "_commit_user_rewards",
+    "get_character_from_json",
+)
+
+CLASSES = {
+    "Hero": "rage",
+    "Berserker": "rage",
+    "Autoaimer": "autoaim",
+    "Tilter": "rant",
+    "Samaritan": "pray",
+}
+
+CHEST_NAMES = ("normal", "rare", "epic", "legendary", "ascended", "set")
+
+
+class PhaseTimer:
+    """Collects wall-clock samples per phase; mergeable across worker processes."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def wrap(self, name: str, func):
+        samples = self.samples[name]
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    samples.append(time.perf_counter() - start)
+
+        else:
+
+            @functools.wraps(func)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    samples.append(time.perf_counter() - start)
+
+        return timed
+
+    def instrument(self, cog):
+        for name in PHASES:
+            setattr(cog, name, self.wrap(name, getattr(cog, name)))
+
+    def merge(self, other: Dict[str, List[float]]):
+        for name, values in other.items():
+            self.samples[name].extend(values)
+
+    def summary(self) -> Dict[str, dict]:
+        report = {}
+        for name in PHASES:
+            values = sorted(self.samples.get(name, []))
+            if not values:
+                continue
+            report[name] = {
+                "calls": len(values),
+                "total_ms": round(sum(values) * 1000, 3),
+                "mean_ms": round(statistics.fmean(values) * 1000, 4),
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 4),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 4),
+                "max_ms": round(values[-1] * 1000, 4),
+            }
+        return report
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    index = min(len(values) - 1, max(0, round(pct * (len(values) - 1))))
+    return values[index]
+
+
+def _distribution(values: List[int]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 2),
+        "p05": _percentile(values, 0.05),
+        "p50": _percentile(values, 0.50),
+        "p95": _percentile(values, 0.95),
+        "max": values[-1],
+    }
+
+
+async def _load_cog(data_dir: Path):
+    """Construct the unmodified cog on top of the in-memory fakes."""
+    import adventure.adventure
+    import adventure.misc
+    from adventure import bank
+
+    bank._config = MemoryConfig()
+    bank._config.register_user(**bank._DEFAULT_MEMBER)
+    adventure.adventure.Config = MemoryConfig
+    adventure.adventure.cog_data_path = lambda *args, **kwargs: data_dir
+    adventure.misc.cog_data_path = lambda *args, **kwargs: data_dir
+
+    bot = FakeBot()
+    cog = adventure.adventure.Adventure(bot)
+    bot.add_cog(cog)
+    await cog.config.schema_version.set(adventure.misc._SCHEMA_VERSION)
+    await cog._init_task
+    if cog.gb_task is not None:
+        cog.gb_task.cancel()
+    cog.timed_roles_task.cancel()
+    return bot, cog
+
+
+async def _make_adventurer(cog, member: FakeMember, rng: random.Random, population_rebirths: int, backpack: int = 0):
+    from adventure import bank
+    from adventure.charsheet import ORDER
+    from adventure.utils import multinomial
+
+    rebirths = min(int(rng.expovariate(1 / max(population_rebirths, 1))), 100)
+    class_name = rng.choice(list(CLASSES))
+    group = cog.config.user(member)
+    await group.rebirths.set(rebirths)
+    await getattr(group, "class").set(
+        {"name": class_name, "ability": class_name != "Hero" and rng.random() < 0.3, "desc": "", "cooldown": 0}
+    )
+    c = await cog.get_character_from_json(member)
+    c.lvl = rng.randint(max(1, c.maxlevel // 2), c.maxlevel)
+    c.exp = int(c.lvl ** 3.5)
+    points = c.lvl // 2 + rebirths * 5
+    for _ in range(points):
+        c.skill[rng.choice(("att", "cha", "int"))] += 1
+
+    if rebirths >= 15:
+        weights = (0, 0, 2, 4, 1, 1)
+    elif rebirths >= 5:
+        weights = (1, 3, 4, 1, 0, 0)
+    else:
+        weights = (6, 3, 1, 0, 0, 0)
+    for slot in ORDER:
+        if slot == "two handed":
+            continue
+        rarity = rng.choices(CHEST_NAMES, weights=weights)[0]
+        item = await cog._genitem(rarity, slot)
+        await c.equip_item(item, from_backpack=False, dev=True)
+    for (rarity, count) in zip(CHEST_NAMES, multinomial(backpack, weights)):
+        for item in await cog._genitems(rarity, count):
+            await c.add_to_backpack(item, number=item.owned)
+    await cog.config.user(member).set(await c.to_json(cog.config))
+    await bank.set_balance(member, rng.randint(0, 50_000 * (rebirths + 1)))
+    return class_name
+
+
+async def _run_adventure(cog, ctx: FakeContext, party: List[FakeMember], classes: dict, rng: random.Random):
+    session = await cog._create_session(ctx)
+    message = FakeMessage(ctx.channel, ctx.me, content=session.challenge)
+    ctx.channel.messages[message.id] = message
+    session.message_id = message.id
+    session.message = message
+    session.countdown_message = message
+    session.reacted = rng.random() < 0.5
+    for member in party:
+        action = CLASSES[classes[member.id]]
+        if rng.random() < 0.15:
+            action = rng.choice(("rage", "autoaim", "rant", "pray"))
+        cog._join_session(session, member)
+        session.add_reaction(member, action)
+        if rng.random() < 0.05:
+            session.remove_reaction(member, action)
+
+    cog._rewards = {}
+    await cog._result(ctx, message)
+    rewards = {uid: r for uid, r in cog._rewards.items() if r}
+    await cog._commit_rewards(ctx, session.participants, cog._rewards.copy())
+    cog._rewards = {}
+    ctx.channel.messages.pop(message.id, None)
+    cog._end_session(ctx.channel.id)
+    # simulated time does not pass, so drop the finished session's expiry entry by hand
+    cog._expire_sessions(float("inf"))
+    if session.boss:
+        kind = "boss"
+    elif session.miniboss:
+        kind = "miniboss"
+    elif session.transcended:
+        kind = "transcended"
+    else:
+        kind = "normal"
+    return kind, rewards
+
+
+async def _run_batch(worker: int, adventures: int, options: dict) -> dict:
+    logging.getLogger("red.cogs.adventure").setLevel(logging.ERROR)
+    rng = random.Random(options["seed"] + worker)
+    random.seed(options["seed"] * 7919 + worker)
+    with tempfile.TemporaryDirectory(prefix="adventure-sim-") as tmp:
+        bot, cog = await _load_cog(Path(tmp))
+        guild = FakeGuild()
+        bot.guilds.append(guild)
+        channel = FakeChannel(guild, bot.user)
+        timer = PhaseTimer()
+
+        members = [FakeMember(guild, f"Adventurer {i}") for i in range(options["population"])]
+        classes = {}
+        for member in members:
+            classes[member.id] = await _make_adventurer(
+                cog, member, rng, options["rebirths"], options.get("backpack", 0)
+            )
+        timer.instrument(cog)
+
+        low, high = options["party"]
+        outcomes = []
+        started = time.perf_counter()
+        for _ in range(adventures):
+            party = rng.sample(members, rng.randint(low, min(high, len(members))))
+            ctx = FakeContext(bot, channel, party[0])
+            api_before = channel.api_calls
+            try:
+                kind, rewards = await _run_adventure(cog, ctx, party, classes, rng)
+            except Exception:
+                logging.getLogger("benchmarks").exception("Simulated adventure failed")
+                cog._end_session(channel.id)
+                continue
+            chests = Counter()
+            for reward in rewards.values():
+                if reward.get("special"):
+                    for name, count in zip(CHEST_NAMES, reward["special"]):
+                        chests[name] += count
+            outcomes.append(
+                {
+                    "kind": kind,
+                    "party": len(party),
+                    "win": bool(rewards),
+                    "xp": [r["xp"] for r in rewards.values()],
+                    "cp": [r["cp"] for r in rewards.values()],
+                    "chests": dict(chests),
+                    "api_calls": channel.api_calls - api_before,
+                }
+            )
+        elapsed = time.perf_counter() - started
+    return {"outcomes": outcomes, "timings": dict(timer.samples), "elapsed": elapsed}
+
+
+def _worker(args):
+    worker, adventures, options = args
+    return asyncio.run(_run_batch(worker, adventures, options))
+
+
+def build_report(batches: List[dict], options: dict) -> dict:
+    timer = PhaseTimer()
+    outcomes = []
+    busy = 0.0
+    for batch in batches:
+        outcomes.extend(batch["outcomes"])
+        timer.merge(batch["timings"])
+        busy += batch["elapsed"]
+
+    def win_rate(rows):
+        return round(sum(r["win"] for r in rows) / len(rows), 4) if rows else None
+
+    by_kind = defaultdict(list)
+    by_party = defaultdict(list)
+    chests = Counter()
+    for row in outcomes:
+        by_kind[row["kind"]].append(row)
+        by_party[row["party"]].append(row)
+        chests.update(row["chests"])
+
+    return {
+        "options": options,
+        "adventures": len(outcomes),
+        "win_rate": win_rate(outcomes),
+        "win_rate_by_kind": {k: {"count": len(v), "win_rate": win_rate(v)} for k, v in sorted(by_kind.items())},
+        "win_rate_by_party_size": {k: win_rate(v) for k, v in sorted(by_party.items())},
+        "xp_per_winner": _distribution([x for r in outcomes for x in r["xp"]]),
+        "cp_per_winner": _distribution([x for r in outcomes for x in r["cp"]]),
+        "chests_per_adventure": {name: round(chests[name] / max(len(outcomes), 1), 4) for name in CHEST_NAMES},
+        "api_calls_per_adventure": _distribution([r["api_calls"] for r in outcomes]),
+        "phases": timer.summary(),
+        "adventures_per_hour_per_worker": round(len(outcomes) / busy * 3600 / max(len(batches), 1)) if busy else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--adventures", type=int, default=1000, help="Total adventures to simulate.")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="Worker processes.")
+    parser.add_argument("--party", type=int, nargs=2, default=(1, 6), metavar=("MIN", "MAX"), help="Party size.")
+    parser.add_argument("--population", type=int, default=50, help="Simulated players per worker.")
+    parser.add_argument("--rebirths", type=int, default=5, help="Mean rebirth count of the population.")
+    parser.add_argument("--backpack", type=int, default=0, help="Loot items given to each simulated player.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    options = {
+        "seed": args.seed,
+        "party": list(args.party),
+        "population": max(args.population, args.party[1]),
+        "rebirths": args.rebirths,
+        "backpack": max(0, args.backpack),
+        "workers": max(1, args.workers),
+    }
+    workers = options["workers"]
+    share, extra = divmod(args.adventures, workers)
+    jobs = [(i, share + (i < extra), options) for i in range(workers)]
+    if workers == 1:
+        batches = [_worker(jobs[0])]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            batches = pool.map(_worker, jobs)
+
+    report = json.dumps(build_report(batches, options), indent=2)
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
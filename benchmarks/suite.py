@@ -0,0 +1,304 @@
+"""Synthetic-data benchmarks for the character, loot and leaderboard hot paths.
+
+Builds user datasets of configurable size on top of :class:`benchmarks.fakes.MemoryConfig`
+and times the cog code that scales with them. Results are written as JSON; pass an earlier
+report with ``--baseline`` to get a speedup figure for every matching case.
+
+Example::
+
+    python -m benchmarks.suite --users 1000 100000 --backpack 10 1000 10000 --output after.json
+    python -m benchmarks.suite --baseline before.json
+
+``--users 1000000`` is supported but needs several GB of memory, since like Red's own
+drivers the stand-in materialises every user's defaults on ``all_users()``.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from .fakes import FakeChannel, FakeContext, FakeGuild, FakeMember, MemoryConfig
+from .simulate import _load_cog
+
+RARITY_WEIGHTS = {"normal": 40, "rare": 30, "epic": 15, "legendary": 8, "ascended": 4, "set": 3}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+class Runner:
+    """Times coroutines and collects the results under a case name and its parameters."""
+
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: List[dict] = []
+
+    async def measure(
+        self,
+        case: str,
+        params: dict,
+        func: Callable[..., Awaitable],
+        setup: Callable[[], Awaitable[tuple]] = None,
+        repeat: int = None,
+        per_call: int = 1,
+    ):
+        """Run ``func(*await setup())`` ``repeat`` times; only ``func`` is timed.
+
+        ``per_call`` divides each sample when ``func`` performs that many operations.
+        """
+        samples = []
+        for _ in range(repeat or self.repeat):
+            args = await setup() if setup is not None else ()
+            start = time.perf_counter()
+            await func(*args)
+            samples.append((time.perf_counter() - start) / per_call)
+        result = {
+            "case": case,
+            "params": params,
+            "runs": len(samples),
+            "min_ms": round(min(samples) * 1000, 4),
+            "median_ms": round(statistics.median(samples) * 1000, 4),
+            "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        }
+        self.results.append(result)
+        logging.getLogger("benchmarks").info("%s %s: %.4f ms", case, params, result["median_ms"])
+        return result
+
+
+def _raw(config) -> MemoryConfig:
+    """The MemoryConfig underneath the cog's I/O accounting proxy."""
+    from adventure.metrics import Metrics
+
+    return Metrics.untrack_config(config)
+
+
+async def _random_items(cog, count: int, rng: random.Random) -> list:
+    from adventure.utils import multinomial
+
+    # multinomial draws from the module level generator, which run() seeds
+    items = []
+    for (rarity, amount) in zip(RARITY_WEIGHTS, multinomial(count, list(RARITY_WEIGHTS.values()))):
+        items.extend(await cog._genitems(rarity, amount))
+    rng.shuffle(items)
+    return items
+
+
+async def bench_character(cog, runner: Runner, guild: FakeGuild, sizes: List[int], rng: random.Random):
+    from adventure.charsheet import Character
+
+    for size in sizes:
+        member = FakeMember(guild, f"Hoarder {size}")
+        c = await cog.get_character_from_json(member)
+        c.lvl = c.maxlevel
+        # name collisions stack into one entry, so top the backpack up a few times
+        for _ in range(20):
+            if len(c.backpack) >= size:
+                break
+            for item in await _random_items(cog, size - len(c.backpack), rng):
+                await c.add_to_backpack(item, number=item.owned)
+        await cog.config.user(member).set(await c.to_json(cog.config))
+        params = {"backpack": len(c.backpack)}
+
+        async def load():
+            return await Character.from_json(cog.config, member, cog._daily_bonus)
+
+        await runner.measure("Character.from_json", params, load)
+        c = await load()
+        await runner.measure("Character.to_json", params, c.to_json, setup=lambda: _args(cog.config))
+        await runner.measure(
+            "Character.get_sorted_backpack", params, c.get_sorted_backpack, setup=lambda: _args(c.backpack)
+        )
+        await runner.measure("Character.get_backpack", params, c.get_backpack)
+
+
+async def _args(*args) -> tuple:
+    return args
+
+
+async def bench_chests(cog, runner: Runner, channel: FakeChannel, amounts: List[int]):
+    from adventure.charsheet import Character
+
+    member = FakeMember(channel.guild, "Chest Opener")
+    ctx = FakeContext(cog.bot, channel, member)
+    await cog.get_character_from_json(member)
+
+    async def fresh_character():
+        # start every run from the same empty backpack
+        await cog.config.user(member).clear()
+        return (await Character.from_json(cog.config, member, cog._daily_bonus),)
+
+    for chest in ("normal", "epic", "set"):
+        for amount in amounts:
+
+            async def open_chests(c):
+                await cog._open_chests(ctx, member, chest, amount, c)
+
+            await runner.measure("_open_chests", {"chest": chest, "amount": amount}, open_chests, setup=fresh_character)
+
+
+async def bench_genitem(cog, runner: Runner, calls: int):
+    async def generate(rarity):
+        for _ in range(calls):
+            await cog._genitem(rarity)
+
+    for rarity in RARITY_WEIGHTS:
+        await runner.measure("_genitem", {"rarity": rarity}, generate, setup=lambda: _args(rarity), per_call=calls)
+
+    async def generate_batch(rarity):
+        await cog._genitems(rarity, calls)
+
+    for rarity in RARITY_WEIGHTS:
+        await runner.measure(
+            "_genitems", {"rarity": rarity, "count": calls}, generate_batch, setup=lambda: _args(rarity), per_call=calls
+        )
+
+    await runner.measure("_trader_roll", {"count": 9}, cog._trader_roll, setup=lambda: _args(9))
+    await runner.measure("_trader_get_items", {"count": 9}, cog._trader_get_items, setup=lambda: _pooled(cog, 9))
+
+
+async def _pooled(cog, count: int) -> tuple:
+    # let the background refill finish so every sample draws from a full pool
+    await cog._cart_stock.wait()
+    return (count,)
+
+
+def _populate(cog, count: int, rng: random.Random):
+    """Write ``count`` leaderboard-relevant user records straight into the stand-ins."""
+    from adventure import bank
+
+    config = _raw(cog.config)
+    bank_config = _raw(bank._config)
+    users = config._data[MemoryConfig.USER]
+    accounts = bank_config._data[MemoryConfig.USER]
+    users.clear()
+    accounts.clear()
+    for user_id in range(1, count + 1):
+        rebirths = min(int(rng.expovariate(1 / 5)), 100)
+        wins = rng.randint(0, 5000)
+        users[user_id] = {
+            "lvl": rng.randint(1, 1000),
+            "rebirths": rebirths,
+            "set_items": rng.randint(0, 40),
+            "adventures": {"wins": wins, "loses": rng.randint(0, wins + 1)},
+        }
+        accounts[user_id] = {"balance": rng.randint(0, 10 ** 9), "next_payday": 0}
+
+
+async def bench_leaderboards(cog, runner: Runner, sizes: List[int], rng: random.Random):
+    from adventure import bank
+
+    for size in sizes:
+        _populate(cog, size, rng)
+        params = {"users": size}
+        top = 10
+        await runner.measure("get_leaderboard", params, cog.get_leaderboard)
+        await runner.measure(
+            "get_leaderboard", {**params, "positions": top}, cog.get_leaderboard, setup=lambda: _args(top)
+        )
+        await runner.measure("get_global_scoreboard", params, cog.get_global_scoreboard)
+        cog._separate_economy = True
+        await runner.measure("bank.get_leaderboard", params, bank.get_leaderboard)
+    _populate(cog, 0, rng)
+
+
+def compare(results: List[dict], baseline: dict) -> None:
+    """Annotate ``results`` in place with the speedup over a previous report."""
+    previous = {(r["case"], json.dumps(r["params"], sort_keys=True)): r for r in baseline.get("results", [])}
+    for result in results:
+        before = previous.get((result["case"], json.dumps(result["params"], sort_keys=True)))
+        if before and result["median_ms"]:
+            result["baseline_median_ms"] = before["median_ms"]
+            result["speedup"] = round(before["median_ms"] / result["median_ms"], 3)
+
+
+async def run(options: dict) -> dict:
+    logging.getLogger("red.cogs.adventure").setLevel(logging.ERROR)
+    rng = random.Random(options["seed"])
+    random.seed(options["seed"])
+    runner = Runner(options["repeat"])
+    with tempfile.TemporaryDirectory(prefix="adventure-bench-") as tmp:
+        bot, cog = await _load_cog(Path(tmp))
+        guild = FakeGuild()
+        bot.guilds.append(guild)
+        channel = FakeChannel(guild, bot.user)
+        suites = options["suites"]
+        if "genitem" in suites:
+            await bench_genitem(cog, runner, options["genitem_calls"])
+        if "character" in suites:
+            await bench_character(cog, runner, guild, options["backpack"], rng)
+        if "chests" in suites:
+            await bench_chests(cog, runner, channel, options["chests"])
+        if "leaderboard" in suites:
+            await bench_leaderboards(cog, runner, options["users"], rng)
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": int(time.time()),
+        },
+        "options": options,
+        "results": runner.results,
+    }
+
+
+SUITES = ("genitem", "character", "chests", "leaderboard")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000], help="Leaderboard sizes.")
+    parser.add_argument("--backpack", type=int, nargs="+", default=[10, 100, 1000, 10000], help="Backpack sizes.")
+    parser.add_argument("--chests", type=int, nargs="+", default=[1, 10, 100, 1000], help="Chests opened at once.")
+    parser.add_argument("--genitem-calls", type=int, default=1000, help="Items generated per _genitem sample.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case.")
+    parser.add_argument("--suite", choices=SUITES, nargs="+", default=list(SUITES), dest="suites")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, help="Earlier report to compare against.")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log each case as it finishes.")
+    args = parser.parse_args(argv)
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    options = {
+        "users": args.users,
+        "backpack": args.backpack,
+        "chests": args.chests,
+        "genitem_calls": args.genitem_calls,
+        "repeat": max(1, args.repeat),
+        "suites": args.suites,
+        "seed": args.seed,
+    }
+    report = asyncio.run(run(options))
+    if args.baseline:
+        compare(report["results"], json.loads(args.baseline.read_text()))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
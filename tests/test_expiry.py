@@ -0,0 +1,107 @@
+"""Session expiry driven by the deadline heap in ``MiscMixin._expire_sessions``."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("redbot")
+pytest.importorskip("discord")
+
+from adventure.charsheet import GameSession  # noqa: E402
+from adventure.misc import _SESSION_TTL  # noqa: E402
+from benchmarks.fakes import FakeChannel, FakeGuild  # noqa: E402
+from benchmarks.simulate import _load_cog  # noqa: E402
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def cog(loop, tmp_path):
+    _, cog = loop.run_until_complete(_load_cog(tmp_path))
+    yield cog
+    # the fake sessions are not worth checkpointing on unload
+    cog._sessions.clear()
+    cog.cog_unload()
+
+
+@pytest.fixture
+def ended(cog, monkeypatch):
+    """Channel ids passed to ``_end_session``, in call order."""
+    calls = []
+    end_session = cog._end_session
+
+    def spy(channel_id):
+        calls.append(channel_id)
+        return end_session(channel_id)
+
+    monkeypatch.setattr(cog, "_end_session", spy)
+    return calls
+
+
+def _start(cog, start_time: datetime, channel: FakeChannel = None) -> GameSession:
+    if channel is None:
+        channel = FakeChannel(FakeGuild(), cog.bot.user)
+    session = GameSession(
+        challenge="Goblin", attribute=" terrifying", channel=channel, boss=False, miniboss={}, timer=60, monster={}
+    )
+    session.start_time = start_time
+    cog._sessions[channel.id] = session
+    cog._track_session_expiry(session)
+    return session
+
+
+def test_expires_at_exactly_ttl(cog, ended):
+    now = datetime.now()
+    younger = _start(cog, now - _SESSION_TTL + timedelta(seconds=1))
+    exact = _start(cog, now - _SESSION_TTL)
+    older = _start(cog, now - _SESSION_TTL - timedelta(seconds=1))
+
+    cog._expire_sessions((exact.start_time + _SESSION_TTL).timestamp())
+
+    assert sorted(ended) == sorted([exact.channel.id, older.channel.id])
+    assert list(cog._sessions) == [younger.channel.id]
+    assert [entry[3] for entry in cog._session_expiry] == [younger]
+
+
+def test_nothing_expires_before_deadline(cog, ended):
+    session = _start(cog, datetime.now())
+
+    cog._expire_sessions((session.start_time + _SESSION_TTL).timestamp() - 0.001)
+
+    assert ended == []
+    assert cog._sessions[session.channel.id] is session
+    assert len(cog._session_expiry) == 1
+
+
+def test_ended_session_is_discarded_lazily(cog, ended):
+    session = _start(cog, datetime.now() - _SESSION_TTL * 2)
+    cog._end_session(session.channel.id)
+    ended.clear()
+    # ending a session leaves its heap entry behind until the deadline comes round
+    assert len(cog._session_expiry) == 1
+
+    cog._expire_sessions(datetime.now().timestamp())
+
+    assert ended == []
+    assert cog._session_expiry == []
+    assert session.channel.id not in cog._sessions
+
+
+def test_replaced_session_survives(cog, ended):
+    channel = FakeChannel(FakeGuild(), cog.bot.user)
+    _start(cog, datetime.now() - _SESSION_TTL * 2, channel)
+    replacement = _start(cog, datetime.now(), channel)
+
+    cog._expire_sessions(datetime.now().timestamp())
+
+    assert ended == []
+    assert cog._sessions[channel.id] is replacement
+    assert [entry[3] for entry in cog._session_expiry] == [replacement]